@@ -0,0 +1,177 @@
+import os
+import sys
+import itertools
+import time as pytime
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import backtest_fvg as bt
+from mtf_pyramid import load_data_htf
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+# Cada entrada es un dataset independiente con su propio perfil de costos.
+# Se puede sobrescribir pasando un CSV con las mismas columnas:
+#   python backtest_batch.py manifest.csv
+MANIFEST = [
+    {"symbol": "XAUUSD", "csv_path": "data_xauusd_m1_clean_2023.csv", "spread": 0.20, "slippage_points": 0.50, "comision_r": 0.05},
+    {"symbol": "XAUUSD", "csv_path": "data_xauusd_m1_clean_2024.csv", "spread": 0.20, "slippage_points": 0.50, "comision_r": 0.05},
+    {"symbol": "XAUUSD", "csv_path": "data_xauusd_m1_clean_2026.csv", "spread": 0.20, "slippage_points": 0.50, "comision_r": 0.05},
+    {"symbol": "SPXUSD", "csv_path": "data_spxusd_m1_clean_spx_2025.csv", "spread": 0.50, "slippage_points": 0.50, "comision_r": 0.05},
+]
+
+RR_PARAMS = [2.0, 2.5, 3.0]
+STOP_MULT_PARAMS = [0.5, 0.75, 1.0]
+HTF_TREND_PARAMS = [None]  # Ej. [None, "M15", "H1"]: filtro de tendencia superior
+
+OUTPUT_PATH = "batch_comparison.csv"
+MAX_WORKERS = None  # None = un proceso por dataset (limitado por núcleos)
+
+# =========================
+# 2. CARGA DEL MANIFIESTO
+# =========================
+
+def load_manifest(path=None):
+    if path is None:
+        return [dict(e) for e in MANIFEST]
+
+    manifest = pd.read_csv(path)
+    missing = {"symbol", "csv_path"} - set(manifest.columns)
+    if missing:
+        raise ValueError(f"Manifiesto inválido, faltan columnas: {sorted(missing)}")
+
+    # Costos no especificados -> valores por defecto de backtest_fvg
+    defaults = {"spread": bt.SPREAD, "slippage_points": bt.SLIPPAGE_POINTS, "comision_r": bt.COMISION_R}
+    for col, val in defaults.items():
+        if col not in manifest.columns:
+            manifest[col] = val
+        manifest[col] = manifest[col].fillna(val)
+    return manifest.to_dict("records")
+
+# =========================
+# 3. BACKTEST POR DATASET (WORKER)
+# =========================
+
+def max_drawdown_pct(equity_curve):
+    eq = np.asarray(equity_curve, dtype=float)
+    peak = np.maximum.accumulate(eq)
+    return float(((peak - eq) / peak).max() * 100)
+
+def grid_configs():
+    return list(itertools.product(RR_PARAMS, STOP_MULT_PARAMS, HTF_TREND_PARAMS))
+
+def load_dataset_days(csv_path):
+    # Columnas HTF desde el cache de mtf_pyramid solo si el grid las usa
+    df = load_data_htf(csv_path) if any(HTF_TREND_PARAMS) else bt.load_data(csv_path)
+    return bt.split_days(df)
+
+def entry_costs(entry):
+    return dict(spread=entry["spread"], comision_r=entry["comision_r"], slippage_points=entry["slippage_points"])
+
+def base_row(entry):
+    return {
+        "Symbol": entry["symbol"],
+        "Dataset": os.path.basename(entry["csv_path"]),
+        "Spread": entry["spread"],
+        "Slippage": entry["slippage_points"],
+        "Comision_R": entry["comision_r"],
+    }
+
+def summarize_dataset(row, n_days, grid_outcomes):
+    """
+    Elige la mejor config (primer máximo en orden del grid) y completa la
+    fila. grid_outcomes: lista de trades (R) por config, en orden de
+    grid_configs(). La usan el runner local y el distribuido.
+    """
+    best = None
+    for (rr, sm, htf), outcomes in zip(grid_configs(), grid_outcomes):
+        total_r = sum(outcomes)
+        if best is None or total_r > best['Total_R']:
+            best = {'RR': rr, 'StopMult': sm, 'HTF': htf, 'Total_R': total_r, 'Trades': outcomes}
+
+    trades = best['Trades']
+    equity = bt.compound_equity(trades)
+    wins = sum(1 for r in trades if r > 0)
+
+    row.update({
+        "Dias": n_days,
+        "Best_RR": best['RR'],
+        "Best_StopMult": best['StopMult'],
+        "Best_HTF": best['HTF'] or "-",
+        "Total_R": round(best['Total_R'], 2),
+        "Trades": len(trades),
+        "WinRate_%": round(wins / len(trades) * 100, 2) if trades else 0.0,
+        "Capital_Final": round(equity[-1], 2),
+        "MaxDD_%": round(max_drawdown_pct(equity), 2),
+        "Error": "",
+    })
+    return row
+
+def run_dataset(entry):
+    """
+    Corre el grid completo (RR x StopMult x HTF) sobre un dataset con sus costos.
+    Se ejecuta en un proceso aparte; devuelve una fila de la tabla final.
+    """
+    t0 = pytime.perf_counter()
+    row = base_row(entry)
+
+    try:
+        days = load_dataset_days(entry["csv_path"])
+    except FileNotFoundError:
+        row["Error"] = "CSV no encontrado"
+        row["Segundos"] = pytime.perf_counter() - t0
+        return row
+
+    costs = entry_costs(entry)
+    grid_outcomes = []
+    for rr, sm, htf in grid_configs():
+        outcomes = []
+        for d in days:
+            r = bt.process_day(d, rr_target=rr, stop_mult=sm, htf_trend=htf, **costs)
+            if r is not None: outcomes.append(r)
+        grid_outcomes.append(outcomes)
+
+    summarize_dataset(row, len(days), grid_outcomes)
+    row["Segundos"] = pytime.perf_counter() - t0
+    return row
+
+# =========================
+# 4. EJECUCIÓN EN PARALELO
+# =========================
+
+def run_batch(manifest, max_workers=MAX_WORKERS):
+    # Un proceso por dataset: el tiempo total ~ el dataset más lento
+    workers = max_workers or min(len(manifest), os.cpu_count() or 1)
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_dataset, e): i for i, e in enumerate(manifest)}
+        for fut in as_completed(futures):
+            row = fut.result()
+            row["_orden"] = futures[fut]
+            status = row["Error"] or f"{row['Total_R']:.2f} R"
+            print(f"   -> {row['Symbol']:<8} {row['Dataset']:<40} {status} ({row['Segundos']:.1f}s)")
+            rows.append(row)
+
+    # Orden estable (mismo que el manifiesto) sin importar quién terminó primero
+    rows.sort(key=lambda r: r.pop("_orden"))
+    return pd.DataFrame(rows)
+
+def main():
+    print("=== BACKTEST BATCH (Multi-Símbolo / Multi-Año) ===")
+    manifest = load_manifest(sys.argv[1] if len(sys.argv) > 1 else None)
+    print(f"1. Datasets en manifiesto: {len(manifest)}")
+
+    print("\n2. Ejecutando backtests en paralelo...")
+    t0 = pytime.perf_counter()
+    table = run_batch(manifest)
+    elapsed = pytime.perf_counter() - t0
+
+    print("\n3. Tabla Comparativa:")
+    print(table.drop(columns=["Segundos"]).to_string(index=False))
+    table.to_csv(OUTPUT_PATH, index=False)
+    print(f"\n✅ Guardado en {OUTPUT_PATH} | Tiempo total: {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
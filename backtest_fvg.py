@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 import itertools
-import matplotlib.pyplot as plt
-from datetime import time, timedelta
+from datetime import time
+
+from signal_engine import day_setups
+from data_quality import attach_quality
 
 # =========================
 # 1. CONFIGURACIÓN
@@ -36,11 +38,36 @@ def calculate_indicators(df, atr_period=14, ema_period=50):
     df['ema'] = df['close'].ewm(span=ema_period, adjust=False).mean()
     return df
 
-def simulate_trade_logic(df_day, entry_idx, direction, entry_price, stop_price, target_price, risk_distance):
+def load_data(csv_path):
+    """
+    Lee un CSV limpio (salida de convert_xau.py), calcula indicadores y
+    agrega la máscara 'dia_ok' del índice de calidad por día.
+    """
+    df = pd.read_csv(csv_path)
+    if "timestamp" not in df.columns:
+        df.columns = ["timestamp", "open", "high", "low", "close", "vol", "sp", "rv"][:len(df.columns)]
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df = df.set_index("timestamp").sort_index()
+    df = calculate_indicators(df)
+    return attach_quality(df, csv_path, SESSION_START, SESSION_EXIT)
+
+def split_days(df):
+    # Días malos (huecos, feriados, datos corruptos...) fuera con la máscara precalculada
+    df = df[df['dia_ok'].to_numpy()]
+    return [g for _, g in df.groupby(df.index.date)]
+
+def simulate_trade_logic(df_day, entry_idx, direction, entry_price, stop_price, target_price, risk_distance,
+                         spread=SPREAD, comision_r=COMISION_R, slippage_points=SLIPPAGE_POINTS, detail=False):
     """
     Simula la vida de un trade: Pendiente -> Abierto -> Cerrado
+    Los costos (spread, comisión, slippage) se pueden pasar por símbolo.
+    Con detail=True devuelve (R, indice_fill, indice_salida) en vez de solo R.
     """
+    def _out(r, k):
+        return (r, fill_k, k) if detail else r
+
     is_open = False
+    fill_k = None
     is_breakeven = False
     current_stop = stop_price
     
@@ -59,11 +86,11 @@ def simulate_trade_logic(df_day, entry_idx, direction, entry_price, stop_price,
             if direction == "long":
                 if fut['low'] <= stop_price: return None 
                 if fut['high'] >= target_price: return None 
-                if fut['low'] <= entry_price: is_open = True # FILL (Entrada)
+                if fut['low'] <= entry_price: is_open, fill_k = True, k # FILL (Entrada)
             else:
                 if fut['high'] >= stop_price: return None
                 if fut['low'] <= target_price: return None
-                if fut['high'] >= entry_price: is_open = True # FILL (Entrada)
+                if fut['high'] >= entry_price: is_open, fill_k = True, k # FILL (Entrada)
             
             if not is_open: continue
 
@@ -72,124 +99,119 @@ def simulate_trade_logic(df_day, entry_idx, direction, entry_price, stop_price,
         if ts.time() >= SESSION_EXIT:
             exit_p = fut['close']
             pnl = (exit_p - entry_price) if direction == "long" else (entry_price - exit_p)
-            return (pnl / risk_distance) - COMISION_R
+            return _out((pnl / risk_distance) - comision_r, k)
 
         if direction == "long":
             # Gestión Breakeven
             if not is_breakeven and fut['high'] >= breakeven_trigger:
-                current_stop = entry_price + SPREAD
+                current_stop = entry_price + spread
                 is_breakeven = True
             
             # Stop Loss Check
             if fut['low'] <= current_stop:
                 # Aplicamos Slippage al salir por Stop
-                exit_slippage = current_stop - SLIPPAGE_POINTS if not is_breakeven else current_stop
-                return ((exit_slippage - entry_price) / risk_distance) - COMISION_R
+                exit_slippage = current_stop - slippage_points if not is_breakeven else current_stop
+                return _out(((exit_slippage - entry_price) / risk_distance) - comision_r, k)
             
             # Take Profit Check
             if fut['high'] >= target_price:
-                return ((target_price - entry_price) / risk_distance) - COMISION_R
+                return _out(((target_price - entry_price) / risk_distance) - comision_r, k)
 
         else: # Short
             # Gestión Breakeven
             if not is_breakeven and fut['low'] <= breakeven_trigger:
-                current_stop = entry_price - SPREAD
+                current_stop = entry_price - spread
                 is_breakeven = True
             
             # Stop Loss Check
             if fut['high'] >= current_stop:
                 # Aplicamos Slippage
-                exit_slippage = current_stop + SLIPPAGE_POINTS if not is_breakeven else current_stop
-                return ((entry_price - exit_slippage) / risk_distance) - COMISION_R
+                exit_slippage = current_stop + slippage_points if not is_breakeven else current_stop
+                return _out(((entry_price - exit_slippage) / risk_distance) - comision_r, k)
             
             # Take Profit Check
             if fut['low'] <= target_price:
-                return ((entry_price - target_price) / risk_distance) - COMISION_R
+                return _out(((entry_price - target_price) / risk_distance) - comision_r, k)
                 
     # Cierre al final de los datos del día
     if is_open:
         last_p = df_day.iloc[-1]['close']
         pnl = (last_p - entry_price) if direction == "long" else (entry_price - last_p)
-        return (pnl / risk_distance) - COMISION_R
+        return _out((pnl / risk_distance) - comision_r, len(df_day) - 1)
         
     return None
 
-def process_day(df_day, rr_target, stop_mult):
-    if df_day.iloc[0]['atr'] == 0 or np.isnan(df_day.iloc[0]['atr']): return None
-
-    # Definir rango de apertura (primeros 5 min)
-    end_first5 = (pd.Timestamp.combine(pd.Timestamp.today(), SESSION_START) + timedelta(minutes=4)).time()
-    mask_range = (df_day.index.time >= SESSION_START) & (df_day.index.time <= end_first5)
-    range_candles = df_day.loc[mask_range]
-    if len(range_candles) == 0: return None
+def find_setups(df_day, rr_target, stop_mult, htf_trend=None):
+    """
+    Genera, en orden, cada setup FVG + Breakout del día:
+    (indice_vela, direction, entry, stop, target, risk).
+    Las reglas viven en signal_engine (compartidas con el bot en vivo).
+    No depende de costos: el filtro de spread lo aplica quien consume.
 
-    range_high = range_candles['high'].max()
-    range_low = range_candles['low'].min()
-    atr_val = range_candles.iloc[-1]['atr']
-    
-    # Filtro: Evitar días de volatilidad extrema en apertura
-    if (range_high - range_low) > (atr_val * 5): return None 
+    htf_trend ("M5", "M15", "H1"): filtro opcional de tendencia superior.
+    Requiere las columnas de mtf_pyramid.attach_htf (ej. 'h1_ema').
+    """
+    if htf_trend:
+        htf_ema = df_day[f"{htf_trend.lower()}_ema"].to_numpy()
+        closes = df_day['close'].to_numpy()
 
-    start_idx = np.where(df_day.index.time > end_first5)[0]
-    if len(start_idx) == 0: return None
-    start_idx = start_idx[0]
+    for i, s in day_setups(df_day, rr_target, stop_mult, SESSION_START, SESSION_END):
+        if htf_trend:
+            # Long solo sobre la EMA superior, short solo debajo (NaN = sin datos)
+            if s.direction == "long" and not closes[i] > htf_ema[i]: continue
+            if s.direction == "short" and not closes[i] < htf_ema[i]: continue
+        yield i, s.direction, s.entry, s.stop, s.target, s.risk
 
-    for i in range(start_idx, len(df_day)):
-        if i < 2: continue
-        if df_day.index[i].time() > SESSION_END: break
-            
-        c0, c2 = df_day.iloc[i-2], df_day.iloc[i]
-        curr_atr = c2['atr']
-        min_gap = curr_atr * 0.1
-        
-        direction = None
+def process_day(df_day, rr_target, stop_mult,
+                spread=SPREAD, comision_r=COMISION_R, slippage_points=SLIPPAGE_POINTS, detail=False,
+                htf_trend=None):
+    """
+    Primer trade válido del día (modo Sniper). Devuelve R o None.
+    Con detail=True devuelve un dict con direction, fill_time, exit_time y r.
+    """
+    for i, direction, entry, stop, target, risk in find_setups(df_day, rr_target, stop_mult, htf_trend):
+        if risk < (spread * 2): continue # Filtro Spread
         
-        # --- Lógica de Setup (FVG + Breakout) ---
-        if c2['close'] > c2['ema']: # Tendencia Alcista
-            if (c2['low'] > c0['high']) and (c2['low'] - c0['high'] >= min_gap):
-                if (c2['close'] > range_high):
-                    direction = "long"
-                    entry = c0['high']
-                    stop = c0['low'] - (curr_atr * stop_mult) 
-                    target = entry + ((entry - stop) * rr_target)
-
-        elif c2['close'] < c2['ema']: # Tendencia Bajista
-            if (c2['high'] < c0['low']) and (c0['low'] - c2['high'] >= min_gap):
-                if (c2['close'] < range_low):
-                    direction = "short"
-                    entry = c0['low']
-                    stop = c0['high'] + (curr_atr * stop_mult)
-                    target = entry - ((stop - entry) * rr_target)
-
-        if direction:
-            risk = abs(entry - stop)
-            if risk < (SPREAD * 2): continue # Filtro Spread
-            
-            res_r = simulate_trade_logic(df_day, i+1, direction, entry, stop, target, risk)
-            if res_r is not None:
-                return res_r # Tomamos solo el primer trade válido del día
+        res_r = simulate_trade_logic(df_day, i+1, direction, entry, stop, target, risk,
+                                     spread, comision_r, slippage_points, detail)
+        if res_r is not None:
+            if detail:
+                r, fill_k, exit_k = res_r
+                return {'direction': direction, 'fill_time': df_day.index[fill_k],
+                        'exit_time': df_day.index[exit_k], 'r': r}
+            return res_r # Tomamos solo el primer trade válido del día
     return None
 
 # =========================
 # 3. EJECUCIÓN Y SIMULACIÓN
 # =========================
 
+def compound_equity(trade_outcomes, capital=CAPITAL_INICIAL, riesgo=RIESGO_POR_TRADE):
+    """
+    Curva de equidad con interés compuesto: cada trade arriesga
+    `riesgo` del saldo ACTUAL.
+    """
+    balance = capital
+    equity_curve = [balance]
+    for r in trade_outcomes:
+        # Gestión de Riesgo: Arriesgamos el 1% del saldo ACTUAL
+        risk_amount = balance * riesgo
+        
+        # PnL del trade
+        balance += risk_amount * r
+        equity_curve.append(balance)
+    return equity_curve
+
 def run_full_system():
     print("=== INICIANDO SISTEMA DE TRADING ALGORÍTMICO ===")
     print("1. Cargando y procesando datos...")
     try:
-        df = pd.read_csv(CSV_PATH)
+        df = load_data(CSV_PATH)
     except FileNotFoundError:
         print(f"Error: No se encuentra '{CSV_PATH}'")
         return
-        
-    if "timestamp" not in df.columns:
-        df.columns = ["timestamp", "open", "high", "low", "close", "vol", "sp", "rv"][:len(df.columns)]
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    df = df.set_index("timestamp").sort_index()
-    df = calculate_indicators(df)
     
-    days = [g for _, g in df.groupby(df.index.date) if len(g) > 30]
+    days = split_days(df)
     print(f"   -> Días operativos encontrados: {len(days)}")
 
     # --- PASO 1: OPTIMIZACIÓN (Encontrar los mejores parámetros) ---
@@ -219,24 +241,12 @@ def run_full_system():
     # --- PASO 2: SIMULACIÓN DE DINERO (INTERÉS COMPUESTO) ---
     print("\n3. Simulando Crecimiento de Cuenta (Interés Compuesto)...")
     
-    balance = CAPITAL_INICIAL
-    equity_curve = [balance]
     trade_outcomes = best_config['Trades']
+    equity_curve = compound_equity(trade_outcomes)
+    balance = equity_curve[-1]
     
-    wins = 0
-    losses = 0
-    
-    for r in trade_outcomes:
-        # Gestión de Riesgo: Arriesgamos el 1% del saldo ACTUAL
-        risk_amount = balance * RIESGO_POR_TRADE
-        
-        # PnL del trade
-        pnl = risk_amount * r
-        balance += pnl
-        equity_curve.append(balance)
-        
-        if r > 0: wins += 1
-        else: losses += 1
+    wins = sum(1 for r in trade_outcomes if r > 0)
+    losses = len(trade_outcomes) - wins
 
     net_profit = balance - CAPITAL_INICIAL
     roi = (net_profit / CAPITAL_INICIAL) * 100
@@ -250,16 +260,17 @@ def run_full_system():
     print(f"📊 Win Rate Real:    {win_rate:.2f}%")
     print(f"🎲 Total Trades:     {len(trade_outcomes)}")
     
-    # --- GRÁFICA ---
-    plt.figure(figsize=(10, 6))
-    plt.plot(equity_curve, label='Curva de Equidad (Compuesta)', color='green', linewidth=1.5)
-    plt.axhline(y=CAPITAL_INICIAL, color='r', linestyle='--', alpha=0.5, label='Capital Inicial')
-    plt.title(f"Crecimiento de Cuenta: {CAPITAL_INICIAL} -> {balance:,.0f}\n(RR: {best_config['RR']} | Stop: {best_config['StopMult']} ATR)")
-    plt.xlabel("# Operaciones")
-    plt.ylabel("Saldo (MXN)")
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.show()
+    # --- REPORTE (PNG + HTML, sin ventanas) ---
+    summary = pd.DataFrame([{'RR': r['RR'], 'StopMult': r['StopMult'], 'Total_R': r['Total_R'],
+                             'Trades': len(r['Trades'])} for r in results])
+    curves = [(f"Crecimiento de Cuenta: {CAPITAL_INICIAL} -> {balance:,.0f}\n(RR: {best_config['RR']} | Stop: {best_config['StopMult']} ATR)",
+               equity_curve)]
+    curves += [(f"RR: {r['RR']} | Stop: {r['StopMult']} ATR | {r['Total_R']:.2f} R", compound_equity(r['Trades']))
+               for r in results if r is not best_config]
+    heatmaps = [("Total R (filas: RR, columnas: Stop ATR)", summary.pivot(index='RR', columns='StopMult', values='Total_R'))]
+    from reporting import build_report  # matplotlib solo al reportar (no al importar este módulo)
+    index = build_report("backtest_fvg", curves, heatmaps, table=summary, capital=CAPITAL_INICIAL)
+    print(f"\n📄 Reporte guardado en {index}")
 
 if __name__ == "__main__":
     run_full_system()
\ No newline at end of file
@@ -1,8 +1,10 @@
 import pandas as pd
 import numpy as np
 import itertools
-import matplotlib.pyplot as plt
-from datetime import time, timedelta
+from datetime import time
+
+from signal_engine import day_setups
+from data_quality import attach_quality
 
 # =========================
 # 1. CONFIGURACIÓN
@@ -106,80 +108,33 @@ def simulate_trade_logic(df_day, entry_idx, direction, entry_price, stop_price,
     return (None, len(df_day)-1)
 
 def process_day(df_day, rr_target, stop_mult):
-    if df_day.iloc[0]['atr'] == 0 or np.isnan(df_day.iloc[0]['atr']): return []
-
-    end_first5 = (pd.Timestamp.combine(pd.Timestamp.today(), SESSION_START) + timedelta(minutes=4)).time()
-    mask_range = (df_day.index.time >= SESSION_START) & (df_day.index.time <= end_first5)
-    range_candles = df_day.loc[mask_range]
-    if len(range_candles) == 0: return []
-
-    range_high = range_candles['high'].max()
-    range_low = range_candles['low'].min()
-    atr_val = range_candles.iloc[-1]['atr']
-    
-    if (range_high - range_low) > (atr_val * 5): return [] 
-
-    start_idx_arr = np.where(df_day.index.time > end_first5)[0]
-    if len(start_idx_arr) == 0: return []
+    # Setups del día (reglas compartidas con backtest_fvg y el bot en vivo)
+    setups = day_setups(df_day, rr_target, stop_mult, SESSION_START, SESSION_END)
     
-    # Usamos un while loop para poder saltar índices
-    i = start_idx_arr[0]
+    # Indice desde el cual se aceptan nuevas entradas (salto tras cada trade)
+    i = 0
     daily_trades = []
     
-    while i < len(df_day):
-        if i < 2: 
-            i += 1
+    for setup_idx, s in setups:
+        if setup_idx < i:
             continue
-            
-        if df_day.index[i].time() > SESSION_END: 
-            break
-            
-        c0, c2 = df_day.iloc[i-2], df_day.iloc[i]
-        curr_atr = c2['atr']
-        min_gap = curr_atr * 0.1
-        
-        direction = None
+        i = setup_idx
         
-        # Setup Logic
-        if c2['close'] > c2['ema']: 
-            if (c2['low'] > c0['high']) and (c2['low'] - c0['high'] >= min_gap):
-                if (c2['close'] > range_high):
-                    direction = "long"
-                    entry = c0['high']
-                    stop = c0['low'] - (curr_atr * stop_mult) 
-                    target = entry + ((entry - stop) * rr_target)
-
-        elif c2['close'] < c2['ema']: 
-            if (c2['high'] < c0['low']) and (c0['low'] - c2['high'] >= min_gap):
-                if (c2['close'] < range_low):
-                    direction = "short"
-                    entry = c0['low']
-                    stop = c0['high'] + (curr_atr * stop_mult)
-                    target = entry - ((stop - entry) * rr_target)
-
-        trade_executed = False
-        if direction:
-            risk = abs(entry - stop)
-            if risk >= (SPREAD * 2): 
-                # Intentamos simular
-                res_tuple = simulate_trade_logic(df_day, i+1, direction, entry, stop, target, risk)
+        if s.risk >= (SPREAD * 2): 
+            # Intentamos simular
+            res_tuple = simulate_trade_logic(df_day, i+1, s.direction, s.entry, s.stop, s.target, s.risk)
+            
+            if res_tuple:
+                r_val, exit_idx = res_tuple
                 
-                if res_tuple:
-                    r_val, exit_idx = res_tuple
-                    
-                    if r_val is not None:
-                        # Trade completado
-                        daily_trades.append(r_val)
-                        i = exit_idx # Saltamos al momento de salida
-                        trade_executed = True
-                    else:
-                        # Orden cancelada o no llenada, saltamos hasta donde se canceló
-                        if exit_idx > i:
-                            i = exit_idx
-                            trade_executed = True
-        
-        if not trade_executed:
-            i += 1
+                if r_val is not None:
+                    # Trade completado
+                    daily_trades.append(r_val)
+                    i = exit_idx # Saltamos al momento de salida
+                else:
+                    # Orden cancelada o no llenada, saltamos hasta donde se canceló
+                    if exit_idx > i:
+                        i = exit_idx
             
     return daily_trades
 
@@ -201,8 +156,10 @@ def run_full_system():
     df["timestamp"] = pd.to_datetime(df["timestamp"])
     df = df.set_index("timestamp").sort_index()
     df = calculate_indicators(df)
+    df = attach_quality(df, CSV_PATH, SESSION_START, SESSION_EXIT)
     
-    days = [g for _, g in df.groupby(df.index.date) if len(g) > 30]
+    df = df[df['dia_ok'].to_numpy()]
+    days = [g for _, g in df.groupby(df.index.date)]
     print(f"   -> Días: {len(days)}")
 
     print("\n2. Optimizando (Buscando mejor config para Multi-Trade)...")
@@ -244,9 +201,14 @@ def run_full_system():
     print(f"💰 Final: ${balance:,.2f} (+{(net/CAPITAL_INICIAL)*100:.2f}%)")
     print(f"📊 Win Rate: {(wins/len(trades))*100:.2f}% ({len(trades)} trades)")
     
-    plt.plot(equity)
-    plt.title(f"Multi-Trade Equity: {best['RR']}R / {best['StopMult']} Stop")
-    plt.show()
+    # Reporte (PNG + HTML, sin ventanas)
+    summary = pd.DataFrame([{'RR': r['RR'], 'StopMult': r['StopMult'], 'Total_R': r['Total_R'],
+                             'Trades': len(r['Trades'])} for r in results])
+    heatmaps = [("Total R (filas: RR, columnas: Stop ATR)", summary.pivot(index='RR', columns='StopMult', values='Total_R'))]
+    from reporting import build_report  # matplotlib solo al reportar (no al importar este módulo)
+    index = build_report("backtest_multi", [(f"Multi-Trade Equity: {best['RR']}R / {best['StopMult']} Stop", equity)],
+                         heatmaps, table=summary, capital=CAPITAL_INICIAL)
+    print(f"📄 Reporte guardado en {index}")
 
 if __name__ == "__main__":
     run_full_system()
\ No newline at end of file
@@ -1,9 +1,14 @@
 import MetaTrader5 as mt5
 import pandas as pd
 import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, time as dt_time
 import pytz
 
+from signal_engine import SignalEngine
+
 # ==========================================
 # 1. CONFIGURACIÓN DE USUARIO (CALIBRAR ANTES DE USAR)
 # ==========================================
@@ -17,6 +22,7 @@ MAGIC_NUMBER = 888999    # ID del Bot (La "firma" de tus órdenes)
 CAPITAL_REAL_MXN = 20000.0 # Solo referencia visual
 RIESGO_PCT = 0.01        # 1% de riesgo por trade
 RR_TARGET = 3.0          # Ratio 1:3
+STOP_MULT = 0.75         # Stop = Low/High de la vela base -/+ 0.75 x ATR (igual que el backtest)
 MAX_SPREAD_PUNTOS = 35   # Si el spread > 35 puntos (35 centavos), no opera.
 
 # Horarios (Ajustar a la HORA DEL SERVIDOR de tu MT5)
@@ -29,6 +35,17 @@ HORA_CIERRE_FORZOSO = 20 # Hora a la que cierra todo (20:00 server = 1:00 PM NY)
 # Indicadores
 EMA_PERIOD = 50
 ATR_PERIOD = 14
+VELAS_WARMUP = 1000      # Velas históricas para inicializar EMA/ATR del motor
+
+# Gestor de Órdenes
+MAX_REINTENTOS_ORDEN = 3       # Intentos por request ante recotización / timeout
+MAX_LATENCIAS = 1000           # Últimas latencias guardadas en memoria
+PRESUPUESTO_CIERRE_SEG = 10.0  # Tiempo máximo para quedar plano en el cierre forzoso
+FILLING_CIERRE = mt5.ORDER_FILLING_IOC  # Revisa el modo de llenado que acepta tu broker
+
+# La librería MetaTrader5 no documenta ser thread-safe: toda llamada a mt5
+# pasa por este candado (el gestor envía desde su propio hilo).
+MT5_LOCK = threading.Lock()
 
 # ==========================================
 # 2. FUNCIONES DE CONEXIÓN Y DATOS
@@ -44,7 +61,8 @@ def conectar_mt5():
     return True
 
 def obtener_datos(simbolo, n_velas=100):
-    rates = mt5.copy_rates_from_pos(simbolo, TIMEFRAME, 0, n_velas)
+    with MT5_LOCK:
+        rates = mt5.copy_rates_from_pos(simbolo, TIMEFRAME, 0, n_velas)
     if rates is None or len(rates) == 0:
         print(f"❌ Error obteniendo datos para {simbolo}")
         return None
@@ -66,7 +84,8 @@ def obtener_datos(simbolo, n_velas=100):
     return df
 
 def checar_spread(simbolo):
-    symbol_info = mt5.symbol_info(simbolo)
+    with MT5_LOCK:
+        symbol_info = mt5.symbol_info(simbolo)
     if symbol_info is None: return 999
     # Retorna spread en puntos (ej. 20 para 0.20 USD en oro estándar)
     return symbol_info.spread
@@ -75,8 +94,9 @@ def checar_spread(simbolo):
 # 3. MÚSCULO DE EJECUCIÓN (ÓRDENES)
 # ==========================================
 
-def enviar_orden_limite(tipo, precio, sl, tp, riesgo_dinero):
-    symbol_info = mt5.symbol_info(SYMBOL)
+def enviar_orden_limite(tipo, precio, sl, tp, riesgo_dinero, gestor):
+    with MT5_LOCK:
+        symbol_info = mt5.symbol_info(SYMBOL)
     if symbol_info is None: return
     
     # 1. Filtro de Spread
@@ -132,27 +152,218 @@ def enviar_orden_limite(tipo, precio, sl, tp, riesgo_dinero):
         "type_filling": mt5.ORDER_FILLING_RETURN,
     }
     
-    res = mt5.order_send(request)
-    if res.retcode != mt5.TRADE_RETCODE_DONE:
-        print(f"❌ Error MT5: {res.comment}")
-    else:
-        print(f"🚀 ORDEN {tipo.upper()} ENVIADA! Ticket: {res.order}")
+    gestor.colocar(request, f"🚀 ORDEN {tipo.upper()} ENVIADA! Ticket: {{ticket}}")
+    gestor.procesar()
 
 # ==========================================
-# 4. GESTIÓN ACTIVA (BREAKEVEN)
+# 4. GESTOR DE ÓRDENES (COLA + CONCURRENCIA ACOTADA)
 # ==========================================
 
-def gestionar_posiciones():
+# Retcodes transitorios: se reintenta con un request recién armado (precio actual)
+RETCODES_REINTENTO = {
+    mt5.TRADE_RETCODE_REQUOTE,
+    mt5.TRADE_RETCODE_PRICE_CHANGED,
+    mt5.TRADE_RETCODE_PRICE_OFF,
+    mt5.TRADE_RETCODE_TIMEOUT,
+    mt5.TRADE_RETCODE_CONNECTION,
+    mt5.TRADE_RETCODE_TOO_MANY_REQUESTS,
+}
+
+class GestorOrdenes:
+    """
+    Cola de requests a MT5 (colocar / cancelar / cerrar / modificar SL).
+    `procesar` los envía en lote desde un hilo propio (uno a la vez, bajo
+    MT5_LOCK) para poder acotar la espera, reintenta recotizaciones y
+    timeouts, e imprime la latencia de cada request. Un request que sigue
+    en vuelo al agotarse el presupuesto no se cancela (MT5 ya lo recibió):
+    su resultado se registra cuando llega y su ticket no se re-encola
+    mientras tanto. El ciclo de vida de cada ticket del bot queda en
+    `estado`: PENDIENTE -> ABIERTA -> BE -> CERRADA, o PENDIENTE -> CANCELADA
+    (FINALIZADA si MT5 lo cerró por SL/TP/expiración, ERROR si falló).
+    """
+
+    def __init__(self, max_reintentos=MAX_REINTENTOS_ORDEN):
+        self.pool = ThreadPoolExecutor(max_workers=1)
+        self.max_reintentos = max_reintentos
+        self.cola = deque()
+        self.en_vuelo = {}    # future -> item (persiste entre llamadas a procesar)
+        self.estado = {}      # ticket -> estado
+        self.latencias = deque(maxlen=MAX_LATENCIAS)   # (accion, ticket, intento, retcode, ms)
+
+    # --- Ciclo de vida ---
+    def sincronizar(self):
+        """
+        Órdenes y posiciones vivas del bot según MT5. Los tickets que ya no
+        aparecen pasan a FINALIZADA. (None, None) si MT5 no respondió.
+        """
+        # Primero los resultados tardíos: un cierre confirmado queda CERRADA
+        self._registrar([f for f in self.en_vuelo if f.done()], [])
+        with MT5_LOCK:
+            ordenes = mt5.orders_get(symbol=SYMBOL)
+            posiciones = mt5.positions_get(symbol=SYMBOL)
+        if ordenes is None or posiciones is None: return None, None
+        ordenes = [o for o in ordenes if o.magic == MAGIC_NUMBER]
+        posiciones = [p for p in posiciones if p.magic == MAGIC_NUMBER]
+
+        vivos = set()
+        for o in ordenes:
+            self.estado[o.ticket] = "PENDIENTE"
+            vivos.add(o.ticket)
+        for p in posiciones:
+            if self.estado.get(p.ticket) != "BE": self.estado[p.ticket] = "ABIERTA"
+            vivos.add(p.ticket)
+        for ticket, est in self.estado.items():
+            if ticket not in vivos and est in ("PENDIENTE", "ABIERTA", "BE"):
+                self.estado[ticket] = "FINALIZADA"
+        return ordenes, posiciones
+
+    # --- Requests (se arman al enviar: cada reintento usa el precio actual) ---
+    def colocar(self, request, mensaje=None):
+        self._encolar("COLOCAR", None, lambda: request, "PENDIENTE", mensaje)
+
+    def cancelar(self, orden, mensaje=None):
+        request = {"action": mt5.TRADE_ACTION_REMOVE, "order": orden.ticket}
+        self._encolar("CANCELAR", orden.ticket, lambda: request, "CANCELADA", mensaje)
+
+    def modificar_sl(self, pos, nuevo_sl, mensaje=None):
+        request = {
+            "action": mt5.TRADE_ACTION_SLTP,
+            "position": pos.ticket,
+            "sl": nuevo_sl,
+            "tp": pos.tp,
+            "symbol": SYMBOL,
+            "magic": MAGIC_NUMBER
+        }
+        self._encolar("MODIFICAR", pos.ticket, lambda: request, "BE", mensaje)
+
+    def cerrar(self, pos, mensaje=None):
+        def armar():
+            tick = mt5.symbol_info_tick(SYMBOL)
+            if tick is None: return None
+            es_buy = pos.type == mt5.ORDER_TYPE_BUY
+            return {
+                "action": mt5.TRADE_ACTION_DEAL,
+                "symbol": SYMBOL,
+                "position": pos.ticket,
+                "volume": pos.volume,
+                "type": mt5.ORDER_TYPE_SELL if es_buy else mt5.ORDER_TYPE_BUY,
+                "price": tick.bid if es_buy else tick.ask,
+                "deviation": 20,
+                "magic": MAGIC_NUMBER,
+                "comment": "FVG Cierre Forzoso",
+                "type_time": mt5.ORDER_TIME_GTC,
+                "type_filling": FILLING_CIERRE,
+            }
+        self._encolar("CERRAR", pos.ticket, armar, "CERRADA", mensaje)
+
+    def _encolar(self, accion, ticket, armar, estado_final, mensaje):
+        if ticket is not None and self._ocupado(ticket):
+            print(f"⏳ {accion} #{ticket} omitido: ya hay un request en curso para ese ticket")
+            return
+        self.cola.append({"accion": accion, "ticket": ticket, "armar": armar,
+                          "final": estado_final, "mensaje": mensaje, "intento": 0})
+
+    def _ocupado(self, ticket):
+        return (any(item["ticket"] == ticket for item in self.en_vuelo.values())
+                or any(item["ticket"] == ticket for item in self.cola))
+
+    # --- Envío ---
+    def _enviar(self, item):
+        with MT5_LOCK:
+            t0 = time.perf_counter()
+            request = item["armar"]()
+            res = mt5.order_send(request) if request is not None else None
+            comentario = res.comment if res is not None else mt5.last_error()
+        return res, (time.perf_counter() - t0) * 1000, comentario
+
+    def _registrar(self, hechos, fallidos):
+        """Aplica los resultados de `hechos` (futures terminados de en_vuelo)."""
+        for fut in hechos:
+            item = self.en_vuelo.pop(fut)
+            res, ms, comentario = fut.result()
+            retcode = res.retcode if res is not None else None
+            ticket = item["ticket"] if item["ticket"] is not None else (res.order if res is not None else None)
+            self.latencias.append((item["accion"], ticket, item["intento"], retcode, ms))
+            print(f"⏱️ {item['accion']} #{ticket} -> retcode {retcode} en {ms:.0f} ms (intento {item['intento']})")
+
+            if retcode == mt5.TRADE_RETCODE_DONE:
+                self.estado[ticket] = item["final"]
+                if item["mensaje"]: print(item["mensaje"].format(ticket=ticket))
+            elif (retcode is None or retcode in RETCODES_REINTENTO) and item["intento"] < self.max_reintentos:
+                self.cola.append(item)
+            else:
+                print(f"❌ Error MT5 ({item['accion']} #{ticket}): {comentario}")
+                # Un ticket ya cerrado/cancelado/finalizado conserva su estado
+                if ticket is not None and self.estado.get(ticket) not in ("CERRADA", "CANCELADA", "FINALIZADA"):
+                    self.estado[ticket] = "ERROR"
+                fallidos.append(item)
+
+    def procesar(self, presupuesto=None):
+        """
+        Envía todo lo encolado. Con `presupuesto` (segundos) no espera ni
+        reintenta más allá del límite: lo que quede sin confirmar se
+        devuelve como fallido (lo ya enviado sigue en vuelo y se registra
+        al llegar). Devuelve la lista de requests fallidos.
+        """
+        limite = None if presupuesto is None else time.monotonic() + presupuesto
+        fallidos = []
+
+        while self.cola or self.en_vuelo:
+            while self.cola:
+                item = self.cola.popleft()
+                item["intento"] += 1
+                self.en_vuelo[self.pool.submit(self._enviar, item)] = item
+
+            restante = None if limite is None else limite - time.monotonic()
+            if restante is not None and restante <= 0: break
+            hechos, _ = wait(self.en_vuelo, timeout=restante, return_when=FIRST_COMPLETED)
+            if not hechos: break # Presupuesto agotado
+            self._registrar(hechos, fallidos)
+
+        # Lo que no alcanzó a confirmarse dentro del presupuesto. Lo que aún
+        # no salió se descarta; lo que ya salió no se puede detener.
+        for fut, item in list(self.en_vuelo.items()):
+            if fut.cancel(): del self.en_vuelo[fut]
+            fallidos.append(item)
+        while self.cola:
+            fallidos.append(self.cola.popleft())
+        return fallidos
+
+    def aplanar(self, presupuesto=PRESUPUESTO_CIERRE_SEG):
+        """
+        Cancela todas las pendientes y cierra todas las posiciones del bot
+        en menos de `presupuesto` segundos. Vuelve a revisar MT5 tras cada
+        lote (una pendiente puede llenarse mientras se cancela).
+        """
+        t0 = time.monotonic()
+        limite = t0 + presupuesto
+        while time.monotonic() < limite:
+            ordenes, posiciones = self.sincronizar()
+            if ordenes is None:
+                time.sleep(0.2)
+                continue
+            if not ordenes and not posiciones:
+                print(f"✅ Bot plano en {time.monotonic() - t0:.2f}s")
+                return True
+            for o in ordenes: self.cancelar(o)
+            for p in posiciones: self.cerrar(p)
+            self.procesar(limite - time.monotonic())
+        print(f"🚨 No se pudo quedar plano en {presupuesto:.0f}s. Revisa MT5 manualmente.")
+        return False
+
+# ==========================================
+# 5. GESTIÓN ACTIVA (BREAKEVEN)
+# ==========================================
+
+def gestionar_posiciones(gestor):
     """
     Revisa posiciones abiertas. Si el precio ha avanzado 1.5R,
-    mueve el Stop Loss a Breakeven.
+    mueve el Stop Loss a Breakeven (todas las modificaciones en un lote).
     """
-    posiciones = mt5.positions_get(symbol=SYMBOL)
-    if posiciones is None or len(posiciones) == 0: return
+    _, posiciones = gestor.sincronizar()
+    if not posiciones: return
 
     for pos in posiciones:
-        # Solo gestionar posiciones de este bot
-        if pos.magic != MAGIC_NUMBER: continue
         
         # Datos
         tipo = pos.type # 0 = Buy, 1 = Sell
@@ -174,17 +385,7 @@ def gestionar_posiciones():
             # Si ya avanzó 1.5R y el SL sigue abajo del entry
             if ganancia_actual >= umbral_be and sl_actual < entry:
                 nuevo_sl = entry + 0.10 # +10 centavos para cubrir spread/comisión
-                request = {
-                    "action": mt5.TRADE_ACTION_SLTP,
-                    "position": pos.ticket,
-                    "sl": nuevo_sl,
-                    "tp": tp,
-                    "symbol": SYMBOL,
-                    "magic": MAGIC_NUMBER
-                }
-                res = mt5.order_send(request)
-                if res.retcode == mt5.TRADE_RETCODE_DONE:
-                    print(f"🛡️ BUY Protegido a Breakeven (Ticket: {pos.ticket})")
+                gestor.modificar_sl(pos, nuevo_sl, f"🛡️ BUY Protegido a Breakeven (Ticket: {pos.ticket})")
 
         # --- Lógica Sell ---
         elif tipo == mt5.ORDER_TYPE_SELL:
@@ -192,22 +393,33 @@ def gestionar_posiciones():
             # Si ya avanzó 1.5R y el SL sigue arriba del entry
             if ganancia_actual >= umbral_be and sl_actual > entry:
                 nuevo_sl = entry - 0.10
-                request = {
-                    "action": mt5.TRADE_ACTION_SLTP,
-                    "position": pos.ticket,
-                    "sl": nuevo_sl,
-                    "tp": tp,
-                    "symbol": SYMBOL,
-                    "magic": MAGIC_NUMBER
-                }
-                res = mt5.order_send(request)
-                if res.retcode == mt5.TRADE_RETCODE_DONE:
-                    print(f"🛡️ SELL Protegido a Breakeven (Ticket: {pos.ticket})")
+                gestor.modificar_sl(pos, nuevo_sl, f"🛡️ SELL Protegido a Breakeven (Ticket: {pos.ticket})")
+
+    gestor.procesar()
 
 # ==========================================
-# 5. CEREBRO PRINCIPAL (LOOP)
+# 6. CEREBRO PRINCIPAL (LOOP)
 # ==========================================
 
+def calentar_motor():
+    """
+    Motor de señales (mismas reglas que backtest_fvg) alimentado con velas
+    cerradas históricas; sus setups se ignoran. Devuelve (motor, ultima_vela).
+    """
+    motor = SignalEngine(RR_TARGET, STOP_MULT,
+                         session_start=dt_time(HORA_INICIO_SERVER, MINUTO_INICIO_SERVER),
+                         session_end=dt_time(HORA_FIN_SERVER, 0),
+                         atr_period=ATR_PERIOD, ema_period=EMA_PERIOD)
+
+    df = obtener_datos(SYMBOL, VELAS_WARMUP)
+    ultima_vela = None
+    if df is not None:
+        for row in df.iloc[:-1].itertuples():
+            motor.update(row.time, row.high, row.low, row.close)
+            ultima_vela = row.time
+        print(f"🔥 Motor inicializado con {len(df) - 1} velas | EMA {motor.ema:.2f} | ATR {motor.atr:.2f}")
+    return motor, ultima_vela
+
 def run_bot():
     if not conectar_mt5(): return
     
@@ -217,18 +429,23 @@ def run_bot():
     print(f"💰 Riesgo por Trade: {RIESGO_PCT*100}%")
     print("="*40 + "\n")
 
+    # Motor de señales con warm-up sobre el histórico
+    motor, ultima_vela = calentar_motor()
+
     # Variables de estado
+    gestor = GestorOrdenes()
     dia_actual = datetime.now().day
-    rango_high = None
-    rango_low = None
     trade_realizado_hoy = False
+    rango_reportado = False
+    cierre_hecho_hoy = False
 
     while True:
         # Frecuencia de actualización (1 segundo)
         time.sleep(1)
         
         # Sincronización con Broker
-        tick = mt5.symbol_info_tick(SYMBOL)
+        with MT5_LOCK:
+            tick = mt5.symbol_info_tick(SYMBOL)
         if tick is None: continue
         server_time = datetime.fromtimestamp(tick.time)
         
@@ -236,135 +453,78 @@ def run_bot():
         if server_time.day != dia_actual:
             print(f"📅 Nuevo día operativo: {server_time.date()}")
             dia_actual = server_time.day
-            rango_high = None
-            rango_low = None
             trade_realizado_hoy = False
+            rango_reportado = False
+            cierre_hecho_hoy = False
             
-            # Limpiar órdenes pendientes viejas
-            ordenes = mt5.orders_get(symbol=SYMBOL)
+            # Limpiar órdenes pendientes viejas (en un solo lote)
+            ordenes, _ = gestor.sincronizar()
             if ordenes:
-                for o in ordenes:
-                    if o.magic == MAGIC_NUMBER:
-                        req = {"action": mt5.TRADE_ACTION_REMOVE, "order": o.ticket}
-                        mt5.order_send(req)
-                print("🧹 Órdenes pendientes limpiadas.")
+                for o in ordenes: gestor.cancelar(o)
+                fallidos = gestor.procesar()
+                print(f"🧹 Órdenes pendientes limpiadas ({len(ordenes) - len(fallidos)}/{len(ordenes)}).")
 
         # 2. Gestión de Posiciones (Breakeven y Cierre Forzoso)
-        gestionar_posiciones()
-        
-        if server_time.hour >= HORA_CIERRE_FORZOSO:
-            # Aquí podrías añadir lógica para cerrar todo si quieres irte plano a dormir
-            pass
-
-        # 3. Lógica de Sesión y Rango
-        minutos_del_dia = server_time.hour * 60 + server_time.minute
-        inicio_minutos = HORA_INICIO_SERVER * 60 + MINUTO_INICIO_SERVER
-        fin_minutos = HORA_FIN_SERVER * 60
+        gestionar_posiciones(gestor)
         
-        # Estamos en horario operativo?
-        if minutos_del_dia < inicio_minutos or minutos_del_dia >= fin_minutos:
-            continue # Fuera de horario
+        if server_time.hour >= HORA_CIERRE_FORZOSO and not cierre_hecho_hoy:
+            # Irse plano: cancelar pendientes y cerrar posiciones del bot con tiempo acotado
+            print(f"⏰ Cierre forzoso ({server_time.strftime('%H:%M:%S')}): aplanando...")
+            cierre_hecho_hoy = gestor.aplanar()
 
-        # 4. Capturar Rango (High/Low de los primeros 5 min de sesión)
-        # Se captura EXACTAMENTE 5 minutos después del inicio
-        tiempo_captura = inicio_minutos + 5
-        
-        if rango_high is None:
-            if minutos_del_dia >= tiempo_captura:
-                # Descargar datos recientes para encontrar ese rango
-                df = obtener_datos(SYMBOL, 50)
-                if df is not None:
-                    # Filtramos velas que ocurrieron en la ventana de apertura
-                    # Lógica simple: Tomar las 5 velas anteriores al minuto de captura
-                    # Esto es aproximado pero funcional en vivo
-                    start_rango = pd.Timestamp(server_time.year, server_time.month, server_time.day, HORA_INICIO_SERVER, MINUTO_INICIO_SERVER)
-                    end_rango = start_rango + pd.Timedelta(minutes=5)
-                    
-                    mask = (df['time'] >= start_rango) & (df['time'] < end_rango)
-                    df_rango = df.loc[mask]
-                    
-                    if not df_rango.empty:
-                        rango_high = df_rango['high'].max()
-                        rango_low = df_rango['low'].min()
-                        print(f"📊 Rango Apertura Capturado: High {rango_high} | Low {rango_low}")
-                    else:
-                        # Si no hay datos aun, esperar
-                        pass
-            else:
-                # Aun no pasan los 5 minutos iniciales
-                continue
+        # 3. Alimentar el motor al cierre de cada vela (segundo 0, 1 o 2)
+        if server_time.second > 3: continue
 
-        # 5. Búsqueda de Entrada (Solo si no hemos operado hoy)
-        if rango_high is not None and not trade_realizado_hoy:
-            
-            # Solo analizamos al cierre de vela (segundo 0, 1 o 2)
-            if server_time.second > 3: continue
+        df = obtener_datos(SYMBOL, 20)
+        if df is None: continue
 
-            df = obtener_datos(SYMBOL, 20)
-            if df is None: continue
-            
-            # Índices seguros
-            if len(df) < 5: continue
-            
-            # Velas: -1 (Actual), -2 (Cerrada/Trigger), -3 (Gap Creator), -4 (Base)
-            c2 = df.iloc[-2] # Vela Confirmación
-            c1 = df.iloc[-3]
-            c0 = df.iloc[-4]
-            
-            # Filtro Hora Exacta (V8.5 improvement)
-            # Aseguramos que c2 haya cerrado dentro del horario permitido
-            
-            curr_atr = c2['atr']
-            min_gap = curr_atr * 0.1
+        # Solo velas CERRADAS (la última es la vela en formación) y nuevas
+        cerradas = df.iloc[:-1]
+        if ultima_vela is not None and cerradas['time'].iloc[0] > ultima_vela:
+            # Se perdieron más de 19 velas: EMA/ATR saltarían datos -> recalentar
+            print(f"⚠️ Hueco de velas desde {ultima_vela}. Recalentando motor...")
+            motor, ultima_vela = calentar_motor()
+            continue
+        if ultima_vela is not None:
+            cerradas = cerradas[cerradas['time'] > ultima_vela]
+        if cerradas.empty: continue
+        vela_actual = cerradas['time'].iloc[-1]
+
+        for row in cerradas.itertuples():
+            setup = motor.update(row.time, row.high, row.low, row.close)
+            ultima_vela = row.time
+
+            if motor.range_ok is not None and motor.day == server_time.toordinal() and not rango_reportado:
+                print(f"📊 Rango Apertura Capturado: High {motor.range_high} | Low {motor.range_low} | Válido: {motor.range_ok}")
+                rango_reportado = True
+
+            # 4. Entrada (Solo si no hemos operado hoy). Tras una demora se
+            # re-procesan varias velas: solo se actúa sobre la última cerrada,
+            # un setup de una vela vieja tendría precios viejos.
+            if setup is None or trade_realizado_hoy: continue
+            if row.time != vela_actual:
+                print(f"⏭️ Setup {setup.direction.upper()} de la vela {row.time} ignorado (vela vieja)")
+                continue
+
+            # Filtro de Spread: el riesgo debe ser >= 2x spread (igual que el backtest)
+            with MT5_LOCK:
+                symbol_info = mt5.symbol_info(SYMBOL)
+            if symbol_info is None: continue
             spread_actual = checar_spread(SYMBOL) * symbol_info.point # Convertir puntos a precio
-            
-            # --- SETUP LONG ---
-            # Tendencia + Ruptura High + FVG
-            if c2['close'] > c2['ema']:
-                if c2['close'] > rango_high or c1['close'] > rango_high:
-                    if c2['low'] > c0['high']: # FVG Up
-                        gap_size = c2['low'] - c0['high']
-                        
-                        # Filtro de Spread (V8.5 improvement)
-                        # El gap debe ser mayor al spread + un margen
-                        if gap_size >= min_gap:
-                            entry = c0['high']
-                            sl = c0['low'] - (curr_atr * 0.1)
-                            
-                            # Filtro suicida
-                            if abs(entry - sl) > (spread_actual * 1.5):
-                                tp = entry + (abs(entry - sl) * RR_TARGET)
-                                
-                                # Enviar
-                                account = mt5.account_info()
-                                riesgo_dinero = account.balance * RIESGO_PCT
-                                enviar_orden_limite("long", entry, sl, tp, riesgo_dinero)
-                                trade_realizado_hoy = True
-                                time.sleep(10) # Pausa para evitar doble envío
-
-            # --- SETUP SHORT ---
-            # Tendencia + Ruptura Low + FVG
-            elif c2['close'] < c2['ema']:
-                if c2['close'] < rango_low or c1['close'] < rango_low:
-                    if c2['high'] < c0['low']: # FVG Down
-                        gap_size = c0['low'] - c2['high']
-                        
-                        if gap_size >= min_gap:
-                            entry = c0['low']
-                            sl = c0['high'] + (curr_atr * 0.1)
-                            
-                            if abs(entry - sl) > (spread_actual * 1.5):
-                                tp = entry - (abs(entry - sl) * RR_TARGET)
-                                
-                                account = mt5.account_info()
-                                riesgo_dinero = account.balance * RIESGO_PCT
-                                enviar_orden_limite("short", entry, sl, tp, riesgo_dinero)
-                                trade_realizado_hoy = True
-                                time.sleep(10)
+            if setup.risk < (spread_actual * 2):
+                print(f"⚠️ Setup {setup.direction.upper()} descartado: riesgo {setup.risk:.2f} < 2x spread")
+                continue
+
+            with MT5_LOCK:
+                account = mt5.account_info()
+            riesgo_dinero = account.balance * RIESGO_PCT
+            enviar_orden_limite(setup.direction, setup.entry, setup.stop, setup.target, riesgo_dinero, gestor)
+            trade_realizado_hoy = True
 
 if __name__ == "__main__":
     try:
         run_bot()
     except KeyboardInterrupt:
         print("\n🛑 Bot detenido por el usuario.")
-        mt5.shutdown()
\ No newline at end of file
+        with MT5_LOCK:
+            mt5.shutdown()
\ No newline at end of file
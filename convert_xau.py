@@ -1,5 +1,9 @@
 import pandas as pd
 
+import backtest_fvg as bt
+from data_quality import scan_quality, save_quality, quality_path, report
+from mtf_pyramid import load_pyramid, cache_path
+
 # Lista de archivos de entrada y salida
 files = [
     ("data_xauusd_m23.csv", "data_xauusd_m1_clean_2023.csv"),
@@ -26,12 +30,28 @@ for input_file, output_file in files:
     df = raw.set_index("timestamp").tz_localize("UTC")
     df = df.tz_convert("America/New_York").tz_localize(None)
 
-    # 4) Quedarnos solo con OHLC
-    df_out = df[["open", "high", "low", "close"]]
+    # 4) Quedarnos solo con OHLC, sin timestamps duplicados (cambio de horario)
+    df_out = df[["open", "high", "low", "close"]].sort_index(kind="stable")
+    dup = df_out.index.duplicated(keep="first")
+    dup_por_dia = pd.Series(dup.astype(int), index=df_out.index.normalize()).groupby(level=0).sum()
+    df_out = df_out[~dup]
+
+    # 5) Escaneo de calidad por día sobre lo que queda en el CSV (huecos, velas
+    #    planas, outliers vs ATR, apertura incompleta, feriados), igual que una
+    #    reconstrucción del índice. Los duplicados quitados quedan aparte.
+    quality = scan_quality(bt.calculate_indicators(df_out.copy()), bt.SESSION_START, bt.SESSION_EXIT)
+    quality["duplicados_crudo"] = dup_por_dia.reindex(quality.index, fill_value=0).to_numpy()
 
-    # 5) Guardar CSV limpio
+    # 6) Guardar CSV limpio + índice de calidad (los backtests saltan los días malos)
     df_out.to_csv(output_file)
+    guardado = save_quality(quality, output_file, bt.SESSION_START, bt.SESSION_EXIT)
     print(df_out.head())
-    print(f"Listo: creado {output_file}\n")
+    print(f"Listo: creado {output_file}")
+    report(quality)
+    if guardado: print(f"Listo: creado {quality_path(output_file)}")
+
+    # 7) Pirámide M5/M15/H1 cacheada junto al CSV (la usan los backtests)
+    load_pyramid(output_file)
+    print(f"Listo: creado {cache_path(output_file)}\n")
 
 print("Conversión finalizada.")
@@ -0,0 +1,213 @@
+import sys
+import itertools
+import numpy as np
+import pandas as pd
+
+import backtest_fvg as bt
+from mtf_pyramid import load_data_htf
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+CSV_PATH = bt.CSV_PATH
+
+# Configuración de estrategia a estresar
+RR_TARGET = 3.0
+STOP_MULT = 0.75
+HTF_TREND = None  # "M5", "M15" o "H1" para filtrar por tendencia superior
+
+# Escenarios de costos (se evalúa el producto cartesiano completo)
+SPREADS = [0.10, 0.20, 0.30, 0.50, 0.75, 1.00]
+COMISIONES_R = [0.00, 0.05, 0.10, 0.15]
+SLIPPAGES = [0.00, 0.25, 0.50, 1.00]
+
+OUTPUT_PATH = "cost_sweep.csv"
+
+# =========================
+# 2. RESOLUCIÓN VECTORIZADA DE UN TRADE
+# =========================
+
+def _first(mask, start):
+    """Primer índice >= start donde mask es True (len(mask) si no hay)."""
+    sub = mask[start:]
+    if not len(sub): return len(mask)
+    k = sub.argmax()
+    return start + k if sub[k] else len(mask)
+
+def day_arrays(df_day):
+    return {
+        'high': df_day['high'].to_numpy(dtype=float),
+        'low': df_day['low'].to_numpy(dtype=float),
+        'close': df_day['close'].to_numpy(dtype=float),
+        'is_exit': np.asarray(df_day.index.time >= bt.SESSION_EXIT),
+    }
+
+def resolve_trade(arr, entry_idx, direction, entry, stop, target, risk, spreads, slippages):
+    """
+    Misma máquina de estados que bt.simulate_trade_logic, pero evaluada una
+    sola vez para TODOS los escenarios de costos.
+
+    El fill/cancelación, el toque del stop inicial, el trigger de breakeven y
+    el target no dependen de costos. Lo único que depende del spread es el
+    nivel del stop en breakeven (entry +/- spread), que se resuelve con
+    búsqueda binaria sobre el mínimo acumulado. El slippage solo mueve el
+    precio de salida del stop inicial.
+
+    Devuelve None si la orden no se llena, o una matriz de R brutos (sin
+    comisión) de forma (len(spreads), len(slippages)).
+    """
+    # Los shorts se resuelven como longs espejando los precios
+    if direction == "long":
+        hi, lo, cl = arr['high'], arr['low'], arr['close']
+    else:
+        hi, lo, cl = -arr['low'], -arr['high'], -arr['close']
+        entry, stop, target = -entry, -stop, -target
+    is_exit = arr['is_exit']
+    n = len(hi)
+
+    # --- FASE 1: ORDEN PENDIENTE ---
+    cancel = is_exit | (lo <= stop) | (hi >= target)
+    k_fill = _first(lo <= entry, entry_idx)
+    if k_fill >= n or _first(cancel, entry_idx) <= k_fill:
+        return None
+
+    # --- FASE 2: ORDEN ABIERTA ---
+    trigger = entry + risk * 1.5
+    k_x = _first(is_exit, k_fill)            # cierre forzoso por hora
+    k_be = _first(hi >= trigger, k_fill)     # activación de breakeven
+    k_sl = _first(lo <= stop, k_fill)
+    k_tp = _first(hi >= target, k_fill)
+
+    spreads = np.asarray(spreads, dtype=float)
+    slippages = np.asarray(slippages, dtype=float)
+    shape = (len(spreads), len(slippages))
+    first_exit = min(k_sl, k_tp)
+
+    # Salida antes de breakeven: no depende del spread
+    if k_x <= min(first_exit, k_be):
+        if k_x < n:
+            return np.full(shape, (cl[k_x] - entry) / risk)
+        return np.full(shape, (cl[-1] - entry) / risk)
+    if first_exit < k_be:
+        if k_sl <= k_tp:
+            return np.broadcast_to((stop - slippages - entry) / risk, shape).copy()
+        return np.full(shape, (target - entry) / risk)
+
+    # Breakeven activo desde k_be: stop = entry + spread (sin slippage).
+    # En cada vela el stop se revisa antes que el target.
+    k_tp2 = _first(hi >= target, k_be)
+    last = min(k_tp2, k_x - 1, n - 1)
+    running_min = np.minimum.accumulate(lo[k_be:last + 1])
+    hit = np.searchsorted(-running_min, -(entry + spreads), side='left')
+    be_hit = hit < len(running_min)
+
+    if k_tp2 < k_x and k_tp2 < n:
+        alt = (target - entry) / risk
+    elif k_x < n:
+        alt = (cl[k_x] - entry) / risk
+    else:
+        alt = (cl[-1] - entry) / risk
+
+    gross = np.where(be_hit, spreads / risk, alt)
+    return np.broadcast_to(gross[:, None], shape).copy()
+
+# =========================
+# 3. BARRIDO EN UNA SOLA PASADA
+# =========================
+
+def sweep_day(df_day, rr_target, stop_mult, spreads, slippages, htf_trend=None):
+    """
+    Devuelve (suma_R_bruto, n_trades) por escenario para un día.
+    Cada escenario toma el primer setup que pasa SU filtro de spread y que
+    llega a llenarse (modo Sniper), igual que bt.process_day.
+    """
+    spreads = np.asarray(spreads, dtype=float)
+    gross = np.zeros((len(spreads), len(slippages)))
+    count = np.zeros(len(spreads), dtype=int)
+    pending = np.ones(len(spreads), dtype=bool)
+    arr = None
+
+    for i, direction, entry, stop, target, risk in bt.find_setups(df_day, rr_target, stop_mult, htf_trend):
+        eligible = pending & (risk >= spreads * 2)  # Filtro Spread por escenario
+        if not eligible.any(): continue
+        if arr is None: arr = day_arrays(df_day)
+
+        res = resolve_trade(arr, i + 1, direction, entry, stop, target, risk, spreads, slippages)
+        if res is None: continue  # cancelada para todos los escenarios
+
+        gross[eligible] = res[eligible]
+        count[eligible] = 1
+        pending &= ~eligible
+        if not pending.any(): break
+    return gross, count
+
+def run_sweep(days, rr_target=RR_TARGET, stop_mult=STOP_MULT,
+              spreads=SPREADS, comisiones=COMISIONES_R, slippages=SLIPPAGES, htf_trend=HTF_TREND):
+    """
+    Grid de R total por (spread, comisión, slippage) en una pasada por los
+    días. La comisión es lineal (R - comisión por trade), así que se aplica
+    al final sobre el conteo de trades.
+    """
+    total_gross = np.zeros((len(spreads), len(slippages)))
+    total_trades = np.zeros(len(spreads), dtype=int)
+    for d in days:
+        g, c = sweep_day(d, rr_target, stop_mult, spreads, slippages, htf_trend)
+        total_gross += g
+        total_trades += c
+
+    rows = []
+    for (a, sp), (b, sl), com in itertools.product(enumerate(spreads), enumerate(slippages), comisiones):
+        rows.append({
+            'Spread': sp, 'Slippage': sl, 'Comision_R': com,
+            'Trades': int(total_trades[a]),
+            'Total_R': total_gross[a, b] - com * total_trades[a],
+        })
+    return pd.DataFrame(rows)
+
+# =========================
+# 4. EJECUCIÓN
+# =========================
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    print("=== SENSIBILIDAD A COSTOS (Spread / Comisión / Slippage) ===")
+    print(f"1. Cargando {csv_path}...")
+    try:
+        df = load_data_htf(csv_path) if HTF_TREND else bt.load_data(csv_path)
+    except FileNotFoundError:
+        print(f"Error: No se encuentra '{csv_path}'")
+        return
+    days = bt.split_days(df)
+
+    n_scen = len(SPREADS) * len(COMISIONES_R) * len(SLIPPAGES)
+    print(f"2. Evaluando {n_scen} escenarios en una pasada ({len(days)} días, RR={RR_TARGET}, Stop={STOP_MULT}xATR)...")
+    grid = run_sweep(days)
+    grid.to_csv(OUTPUT_PATH, index=False)
+
+    # Vista resumida: R total por spread x comisión con el slippage base
+    base_slip = bt.SLIPPAGE_POINTS if bt.SLIPPAGE_POINTS in SLIPPAGES else SLIPPAGES[0]
+    view = grid[grid['Slippage'] == base_slip].pivot(index='Spread', columns='Comision_R', values='Total_R')
+    print(f"\n   Total R (Slippage={base_slip}) | filas: Spread, columnas: Comisión R")
+    print(view.round(2).to_string())
+
+    # Spread máximo que el edge tolera para cada nivel de comisión: R no es
+    # monótono en el spread (el filtro de spread cambia qué trades se toman),
+    # así que se exige R > 0 en TODOS los spreads probados hasta ese punto.
+    print("\n   Spread máximo con R > 0 en todos los spreads menores:")
+    for com in view.columns:
+        col = view[com].sort_index()
+        ok = col.index[(col > 0).cummin()]
+        limit = f"{ok.max():.2f}" if len(ok) else "ninguno"
+        print(f"   -> Comisión {com:.2f}R: {limit}")
+    print(f"Grid completo guardado en {OUTPUT_PATH}")
+
+    # Un heatmap Spread x Comisión por cada nivel de slippage
+    heatmaps = [(f"Total R | Slippage={slip} (filas: Spread, columnas: Comisión R)",
+                 grid[grid['Slippage'] == slip].pivot(index='Spread', columns='Comision_R', values='Total_R'))
+                for slip in SLIPPAGES]
+    from reporting import build_report  # matplotlib solo al reportar (no al importar este módulo)
+    index = build_report("cost_sweep", heatmaps=heatmaps, table=grid)
+    print(f"📄 Reporte guardado en {index}")
+
+if __name__ == "__main__":
+    main()
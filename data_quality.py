@@ -0,0 +1,168 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+from datetime import time
+from pandas.tseries.holiday import USFederalHolidayCalendar
+
+from signal_engine import SESSION_START, RANGE_MINUTES
+from npz_cache import load_npz, savez_atomic
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+# Ventana revisada: desde la apertura hasta el cierre forzoso de los
+# backtests (backtest_fvg.SESSION_EXIT). Los backtests pasan sus valores.
+SESSION_EXIT = time(13, 0)
+
+MIN_BARS = 30        # Velas mínimas en el día (el filtro original)
+MAX_GAP_MIN = 3      # Minutos faltantes seguidos tolerados en la ventana
+MAX_PLANAS = 3       # Velas con high == low toleradas en la ventana
+OUTLIER_ATR = 10.0   # Rango de vela > 10 ATR = dato sospechoso
+MAX_OUTLIERS = 0
+
+# Conteos guardados en el índice; "ok" se deriva de ellos con los umbrales
+# vigentes al cargar (cambiar MAX_* no exige reconstruir el índice).
+COLUMNS = ["barras", "duplicados", "duplicados_crudo", "gap_max", "planas", "outliers", "apertura", "feriado"]
+
+# =========================
+# 2. ESCANEO VECTORIZADO
+# =========================
+
+def quality_path(csv_path):
+    return os.path.splitext(csv_path)[0] + "_quality.npz"
+
+def bank_holidays(first_day, last_day):
+    """Feriados bancarios de EE.UU. (calendario federal) como datetime64[D]."""
+    hol = USFederalHolidayCalendar().holidays(start=first_day, end=last_day)
+    return hol.to_numpy(dtype="datetime64[D]")
+
+def scan_quality(df, session_start=SESSION_START, session_exit=SESSION_EXIT, range_minutes=RANGE_MINUTES):
+    """
+    Índice de calidad por día sobre todo el histórico de una vez (sin
+    loops por día). `df` son velas M1 con columna 'atr'; puede traer
+    timestamps duplicados (se cuentan y se ignoran en el resto del escaneo).
+
+    Columnas: barras, duplicados, duplicados_crudo (los que el conversor ya
+    quitó del CSV; informativo, 0 aquí), gap_max (minutos faltantes seguidos
+    en la ventana), planas, outliers (rango > OUTLIER_ATR x ATR previo),
+    apertura (velas del rango de apertura presentes), feriado y ok.
+    """
+    order = np.argsort(df.index.to_numpy(dtype="datetime64[ns]"), kind="stable")
+    ts = df.index.to_numpy(dtype="datetime64[m]")[order]
+    day = ts.astype("datetime64[D]")
+    minute = (ts - day).astype(np.int64)
+    high = df['high'].to_numpy(dtype=float)[order]
+    low = df['low'].to_numpy(dtype=float)[order]
+    atr_prev = np.r_[np.nan, df['atr'].to_numpy(dtype=float)[order][:-1]]
+
+    days, inv = np.unique(day, return_inverse=True)
+    n = len(days)
+    count = lambda mask: np.bincount(inv[mask], minlength=n)
+
+    dup = np.r_[False, ts[1:] == ts[:-1]]
+    start_min = session_start.hour * 60 + session_start.minute
+    exit_min = session_exit.hour * 60 + session_exit.minute
+    win = ~dup & (minute >= start_min) & (minute <= exit_min)
+
+    rng = high - low
+    with np.errstate(invalid="ignore"):
+        outlier = win & (rng > OUTLIER_ATR * atr_prev)
+
+    # Huecos: minutos faltantes entre velas consecutivas de la ventana,
+    # incluyendo el inicio y el final de la ventana.
+    w_day, w_min = inv[win], minute[win]
+    first = np.r_[True, w_day[1:] != w_day[:-1]]
+    last = np.r_[first[1:], True]
+    gap = w_min - np.where(first, start_min - 1, np.r_[0, w_min[:-1]]) - 1
+    gap_max = np.full(n, exit_min - start_min + 1)   # Día sin velas en la ventana
+    has_win = np.zeros(n, dtype=bool)
+    has_win[w_day] = True
+    gap_max[has_win] = 0
+    np.maximum.at(gap_max, w_day, gap)
+    np.maximum.at(gap_max, w_day[last], exit_min - w_min[last])
+
+    q = pd.DataFrame({
+        "barras": count(~dup),
+        "duplicados": count(dup),
+        "duplicados_crudo": np.zeros(n, dtype=np.int64),
+        "gap_max": gap_max,
+        "planas": count(win & (rng <= 0)),
+        "outliers": count(outlier),
+        "apertura": count(win & (minute < start_min + range_minutes)),
+        "feriado": np.isin(days, bank_holidays(days[0], days[-1])) if n else np.zeros(0, dtype=bool),
+    }, index=pd.DatetimeIndex(days, name="fecha"))
+    return flag_ok(q, range_minutes)
+
+def flag_ok(q, range_minutes=RANGE_MINUTES):
+    """Columna 'ok' a partir de los conteos y los umbrales actuales."""
+    q["ok"] = ((q["barras"] > MIN_BARS) & (q["duplicados"] == 0) & ~q["feriado"]
+               & (q["apertura"] == range_minutes) & (q["gap_max"] <= MAX_GAP_MIN)
+               & (q["planas"] <= MAX_PLANAS) & (q["outliers"] <= MAX_OUTLIERS))
+    return q
+
+# =========================
+# 3. ÍNDICE CACHEADO JUNTO AL CSV
+# =========================
+
+def _window(session_start, session_exit, range_minutes):
+    return np.array([session_start.hour * 60 + session_start.minute,
+                     session_exit.hour * 60 + session_exit.minute, range_minutes])
+
+def save_quality(quality, csv_path, session_start=SESSION_START, session_exit=SESSION_EXIT,
+                 range_minutes=RANGE_MINUTES):
+    st = os.stat(csv_path)
+    return savez_atomic(quality_path(csv_path), src_size=st.st_size, src_mtime=st.st_mtime_ns,
+                        window=_window(session_start, session_exit, range_minutes), outlier_atr=OUTLIER_ATR,
+                        fecha=quality.index.to_numpy(dtype="datetime64[D]"),
+                        **{c: quality[c].to_numpy() for c in COLUMNS})
+
+def load_quality(csv_path, df, session_start=SESSION_START, session_exit=SESSION_EXIT,
+                 range_minutes=RANGE_MINUTES):
+    """
+    Índice cacheado (lo escribe convert_xau.py). Se recalcula desde `df`
+    solo si el CSV, la ventana u OUTLIER_ATR cambiaron, o si no existe.
+    "ok" siempre se recalcula con los umbrales actuales. Si el índice no
+    se puede guardar (carpeta de solo lectura) se usa el de memoria.
+    """
+    cached = load_npz(quality_path(csv_path))
+    st = os.stat(csv_path)
+    if (cached is not None and set(COLUMNS) <= set(cached.files) and "outlier_atr" in cached.files
+            and int(cached["src_size"]) == st.st_size and int(cached["src_mtime"]) == st.st_mtime_ns
+            and np.array_equal(cached["window"], _window(session_start, session_exit, range_minutes))
+            and float(cached["outlier_atr"]) == OUTLIER_ATR):
+        q = pd.DataFrame({c: cached[c] for c in COLUMNS},
+                         index=pd.DatetimeIndex(cached["fecha"], name="fecha"))
+        return flag_ok(q, range_minutes)
+
+    quality = scan_quality(df, session_start, session_exit, range_minutes)
+    save_quality(quality, csv_path, session_start, session_exit, range_minutes)
+    return quality
+
+def attach_quality(df, csv_path, session_start=SESSION_START, session_exit=SESSION_EXIT):
+    """Agrega la columna booleana 'dia_ok' (máscara por día del índice de calidad)."""
+    quality = load_quality(csv_path, df, session_start, session_exit)
+    q_days = quality.index.to_numpy(dtype="datetime64[D]")
+    pos = np.searchsorted(q_days, df.index.to_numpy(dtype="datetime64[D]"))
+    pos = np.minimum(pos, len(q_days) - 1)
+    df['dia_ok'] = (q_days[pos] == df.index.to_numpy(dtype="datetime64[D]")) & quality["ok"].to_numpy()[pos]
+    return df
+
+def report(quality):
+    bad = quality[~quality["ok"]]
+    print(f"   Días OK: {int(quality['ok'].sum())} de {len(quality)} | "
+          f"feriados: {int(quality['feriado'].sum())} | huecos: {int((quality['gap_max'] > MAX_GAP_MIN).sum())} | "
+          f"duplicados: {int((quality['duplicados'] > 0).sum())} (quitados del crudo: {int(quality['duplicados_crudo'].sum())}) | "
+          f"planas: {int((quality['planas'] > MAX_PLANAS).sum())} | "
+          f"outliers: {int((quality['outliers'] > MAX_OUTLIERS).sum())} | "
+          f"sin apertura: {int((quality['apertura'] < RANGE_MINUTES).sum())}")
+    return bad
+
+if __name__ == "__main__":
+    import backtest_fvg as bt  # load_data construye/actualiza el índice
+    for path in sys.argv[1:]:
+        df = bt.load_data(path)
+        print(f"✅ {quality_path(path)}")
+        bad = report(load_quality(path, df, bt.SESSION_START, bt.SESSION_EXIT))
+        if len(bad):
+            print(bad.to_string())
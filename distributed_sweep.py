@@ -0,0 +1,324 @@
+import os
+import sys
+import hmac
+import json
+import struct
+import hashlib
+import time as pytime
+import socket
+import traceback
+import multiprocessing as mp
+
+import numpy as np
+import pandas as pd
+
+import backtest_fvg as bt
+from backtest_batch import (load_manifest, grid_configs, load_dataset_days, entry_costs,
+                            base_row, summarize_dataset)
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+# Cola propia sobre TCP: mensajes JSON firmados con HMAC-SHA256 (nada se
+# deserializa con pickle). La clave se toma de la variable de entorno
+# FVG_SWEEP_KEY (la misma en coordinador y workers); sin ella no arranca.
+# Los CSV deben existir en la MISMA ruta en todas las máquinas (disco
+# compartido o copia local).
+HOST = "127.0.0.1"       # "0.0.0.0" para aceptar workers de otras máquinas (solo red de confianza)
+PORT = 6001
+KEY_ENV = "FVG_SWEEP_KEY"
+
+ACCEPT_TIMEOUT = 5.0     # Segundos máximos en accept(): cada vuelta revisa los leases
+CONN_TIMEOUT = 30.0      # Segundos máximos por conexión (un cliente mudo no frena la cola)
+MAX_MENSAJE = 64 * 1024 * 1024
+MAX_REINTENTOS_CONEXION = 8   # Worker: intentos ante coordinador inalcanzable (aún no arranca / red)
+BACKOFF_CONEXION = 0.5        # Espera inicial entre intentos (se duplica, tope 8s)
+
+N_TRAMOS = 4             # Tramos de días contiguos por dataset
+LEASE_TIMEOUT = 600      # Segundos sin resultado antes de reasignar un shard
+MAX_REINTENTOS = 3       # Fallos por shard antes de darlo por perdido
+WORKER_PROCS = os.cpu_count() or 1
+
+OUTPUT_PATH = "distributed_comparison.csv"
+
+# =========================
+# 2. SHARDS
+# =========================
+
+def build_shards(manifest, n_tramos=N_TRAMOS):
+    """
+    Espacio (dataset x tramo de fechas x config). Cada shard se resuelve
+    de forma independiente: los indicadores se calculan sobre el histórico
+    completo y el modo Sniper no arrastra estado entre días.
+    """
+    shards = []
+    for d, entry in enumerate(manifest):
+        for t in range(n_tramos):
+            for c, (rr, sm, htf) in enumerate(grid_configs()):
+                shards.append({
+                    "id": len(shards), "dataset": d, "tramo": t, "n_tramos": n_tramos, "config": c,
+                    "entry": entry, "rr": rr, "stop_mult": sm, "htf": htf,
+                })
+    return shards
+
+_DAYS_CACHE = {}
+
+def run_shard(shard):
+    """R de cada trade del shard (en orden de fecha) y días procesados."""
+    path = shard["entry"]["csv_path"]
+    if path not in _DAYS_CACHE:
+        _DAYS_CACHE.clear()  # Un dataset en memoria por proceso
+        _DAYS_CACHE[path] = load_dataset_days(path)
+    days = _DAYS_CACHE[path]
+
+    chunk = np.array_split(np.arange(len(days)), shard["n_tramos"])[shard["tramo"]]
+    costs = entry_costs(shard["entry"])
+    outcomes = []
+    for k in chunk:
+        r = bt.process_day(days[k], rr_target=shard["rr"], stop_mult=shard["stop_mult"],
+                           htf_trend=shard["htf"], **costs)
+        if r is not None: outcomes.append(r)
+    return {"r": outcomes, "n_days": len(chunk)}
+
+# =========================
+# 3. PROTOCOLO (JSON + HMAC)
+# =========================
+
+def load_authkey():
+    key = os.environ.get(KEY_ENV, "")
+    if not key:
+        sys.exit(f"❌ Falta la clave: exporta {KEY_ENV} (la misma en coordinador y workers).")
+    return key.encode()
+
+def _send(sock, msg, key):
+    body = json.dumps(msg, default=lambda o: o.item()).encode()
+    sig = hmac.new(key, body, hashlib.sha256).digest()
+    sock.sendall(struct.pack(">I", len(body)) + sig + body)
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError("conexión cerrada")
+        buf += chunk
+    return bytes(buf)
+
+def _recv(sock, key):
+    (size,) = struct.unpack(">I", _recv_exact(sock, 4))
+    if size > MAX_MENSAJE:
+        raise ValueError(f"mensaje demasiado grande ({size} bytes)")
+    sig = _recv_exact(sock, hashlib.sha256().digest_size)
+    body = _recv_exact(sock, size)
+    if not hmac.compare_digest(sig, hmac.new(key, body, hashlib.sha256).digest()):
+        raise ValueError("firma inválida (clave incorrecta)")
+    return json.loads(body)
+
+# =========================
+# 4. COORDINADOR
+# =========================
+
+def merge_results(manifest, shards, results, failed):
+    """
+    Une los shards en el mismo orden que backtest_batch (config del grid,
+    luego fecha) y produce la misma tabla que una corrida local.
+    """
+    n_configs = len(grid_configs())
+    rows = []
+    for d, entry in enumerate(manifest):
+        row = base_row(entry)
+        mine = [s for s in shards if s["dataset"] == d]
+        errors = [failed[s["id"]] for s in mine if s["id"] in failed]
+        if errors:
+            row["Error"] = errors[0]
+            rows.append(row)
+            continue
+
+        grid_outcomes = []
+        for c in range(n_configs):
+            parts = sorted((s for s in mine if s["config"] == c), key=lambda s: s["tramo"])
+            grid_outcomes.append([r for s in parts for r in results[s["id"]]["r"]])
+        n_days = sum(results[s["id"]]["n_days"] for s in mine if s["config"] == 0)
+        rows.append(summarize_dataset(row, n_days, grid_outcomes))
+    return pd.DataFrame(rows)
+
+def run_coordinator(manifest, key, host=HOST, port=PORT):
+    shards = build_shards(manifest)
+    pending = list(range(len(shards)))[::-1]   # pila: se reparte en orden
+    leases = {}       # id -> (worker, hora de asignación)
+    attempts = {}     # id -> fallos
+    results = {}      # id -> payload
+    failed = {}       # id -> último error
+
+    print(f"🛰️ Coordinador en {host}:{port} | {len(shards)} shards "
+          f"({len(manifest)} datasets x {N_TRAMOS} tramos x {len(grid_configs())} configs)")
+
+    def requeue(sid, reason):
+        leases.pop(sid, None)
+        attempts[sid] = attempts.get(sid, 0) + 1
+        if attempts[sid] >= MAX_REINTENTOS:
+            failed[sid] = reason
+            print(f"   ❌ Shard {sid} descartado tras {attempts[sid]} intentos: {reason}")
+        else:
+            pending.append(sid)
+            print(f"   🔁 Shard {sid} reencolado ({reason})")
+
+    t0 = pytime.perf_counter()
+    with socket.create_server((host, port)) as listener:
+        listener.settimeout(ACCEPT_TIMEOUT)
+        while len(results) + len(failed) < len(shards):
+            # Leases vencidos (worker caído o colgado) -> reintento
+            now = pytime.monotonic()
+            for sid, (worker, since) in list(leases.items()):
+                if now - since > LEASE_TIMEOUT:
+                    requeue(sid, f"timeout en {worker}")
+
+            try:
+                conn, addr = listener.accept()
+            except socket.timeout:
+                continue  # Nadie conectó: volver a revisar leases
+
+            with conn:
+                conn.settimeout(CONN_TIMEOUT)
+                try:
+                    msg = _recv(conn, key)
+                except (OSError, EOFError, ValueError) as e:  # cliente mudo / clave incorrecta
+                    print(f"   ⚠️ Conexión de {addr[0]} rechazada: {e}")
+                    continue
+
+                if msg[0] == "get":
+                    if pending:
+                        sid = pending.pop()
+                        leases[sid] = (msg[1], pytime.monotonic())
+                        reply = ("job", shards[sid])
+                    else:
+                        reply = ("wait", 2.0)
+
+                elif msg[0] == "result":
+                    _, sid, payload = msg
+                    # Resultados tardíos de un shard ya resuelto se ignoran (son idénticos)
+                    if sid not in results and sid not in failed:
+                        results[sid] = payload
+                        leases.pop(sid, None)
+                        if sid in pending: pending.remove(sid)
+                        done = len(results) + len(failed)
+                        print(f"   -> {done}/{len(shards)} | shard {sid} ({len(payload['r'])} trades)")
+                    reply = ("ok",)
+
+                elif msg[0] == "error":
+                    _, sid, reason = msg
+                    if sid in leases: requeue(sid, reason)
+                    reply = ("ok",)
+
+                else:
+                    continue
+
+                try:
+                    _send(conn, reply, key)
+                except OSError as e:
+                    # Un "job" no entregado vuelve a la cola al vencer su lease
+                    print(f"   ⚠️ Sin respuesta a {addr[0]}: {e}")
+
+    print(f"\n✅ Todos los shards resueltos en {pytime.perf_counter() - t0:.1f}s")
+    return merge_results(manifest, shards, results, failed)
+
+# =========================
+# 5. WORKER
+# =========================
+
+def _request(address, msg, key):
+    with socket.create_connection(address, timeout=CONN_TIMEOUT) as conn:
+        _send(conn, msg, key)
+        return _recv(conn, key)
+
+def _request_retry(address, msg, key, name, contactado):
+    """
+    _request con reintentos y backoff. Si el coordinador ya respondió antes,
+    una conexión rechazada significa que terminó y cerró el puerto: no se
+    reintenta. None = rendirse.
+    """
+    espera = BACKOFF_CONEXION
+    for intento in range(1, MAX_REINTENTOS_CONEXION + 1):
+        try:
+            return _request(address, msg, key)
+        except ConnectionRefusedError:
+            if contactado: return None
+            error = "conexión rechazada"
+        except ValueError as e:  # Respuesta con firma inválida: otra clave
+            print(f"❌ {name}: {e}")
+            return None
+        except (OSError, EOFError) as e:
+            error = e
+        if intento < MAX_REINTENTOS_CONEXION:
+            pytime.sleep(espera)
+            espera = min(espera * 2, 8.0)
+    print(f"⚠️ {name}: coordinador inalcanzable tras {MAX_REINTENTOS_CONEXION} intentos ({error})")
+    return None
+
+def worker_loop(address, name, key):
+    """
+    Pide shards hasta que el coordinador termina (conexión rechazada después
+    de haber respondido) o deja de ser alcanzable tras los reintentos.
+    """
+    contactado = False
+    while True:
+        reply = _request_retry(address, ("get", name), key, name, contactado)
+        if reply is None:
+            return
+        contactado = True
+
+        if reply[0] == "wait":
+            pytime.sleep(reply[1])
+            continue
+        if reply[0] != "job":
+            return
+
+        shard = reply[1]
+        try:
+            payload = run_shard(shard)
+            msg = ("result", shard["id"], payload)
+        except FileNotFoundError:
+            msg = ("error", shard["id"], "CSV no encontrado")
+        except Exception:
+            msg = ("error", shard["id"], traceback.format_exc(limit=1).strip().splitlines()[-1])
+
+        if _request_retry(address, msg, key, name, contactado) is None:
+            return
+
+def run_worker(host, key, port=PORT, procs=WORKER_PROCS):
+    address = (host, port)
+    base = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"🔧 Worker {base} -> {host}:{port} con {procs} procesos")
+    workers = [mp.Process(target=worker_loop, args=(address, f"{base}/{p}", key)) for p in range(procs)]
+    for w in workers: w.start()
+    for w in workers: w.join()
+    print("🏁 Worker terminado.")
+
+# =========================
+# 6. EJECUCIÓN
+# =========================
+# Coordinador:  FVG_SWEEP_KEY=... python distributed_sweep.py coordinator [manifest.csv]
+# Worker:       FVG_SWEEP_KEY=... python distributed_sweep.py worker <host_coordinador> [procesos]
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("coordinator", "worker"):
+        print("Uso: distributed_sweep.py coordinator [manifest.csv] | worker <host> [procesos]")
+        return
+    key = load_authkey()
+
+    if sys.argv[1] == "worker":
+        host = sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1"
+        procs = int(sys.argv[3]) if len(sys.argv) > 3 else WORKER_PROCS
+        run_worker(host, key, PORT, procs)
+        return
+
+    print("=== SWEEP DISTRIBUIDO (Coordinador) ===")
+    manifest = load_manifest(sys.argv[2] if len(sys.argv) > 2 else None)
+    table = run_coordinator(manifest, key)
+    print("\nTabla Comparativa:")
+    print(table.to_string(index=False))
+    table.to_csv(OUTPUT_PATH, index=False)
+    print(f"\n✅ Guardado en {OUTPUT_PATH}")
+
+if __name__ == "__main__":
+    main()
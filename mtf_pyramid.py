@@ -0,0 +1,107 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+import backtest_fvg as bt
+from signal_engine import ATR_PERIOD, EMA_PERIOD
+from npz_cache import load_npz, savez_atomic
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+# Temporalidades superiores que se construyen a partir de M1
+TIMEFRAMES = {"M5": "5min", "M15": "15min", "H1": "1h"}
+FIELDS = ["open", "high", "low", "close", "ema", "atr"]
+
+# Columnas que se agregan al DataFrame M1 (ej. 'h1_ema')
+ATTACH_FIELDS = ["close", "ema", "atr"]
+
+# =========================
+# 2. CONSTRUCCIÓN DE LA PIRÁMIDE
+# =========================
+
+def cache_path(csv_path):
+    return os.path.splitext(csv_path)[0] + "_mtf.npz"
+
+def build_pyramid(df):
+    """
+    Resamplea M1 a cada temporalidad superior y calcula sus indicadores.
+
+    El mapa M1 -> HTF apunta a la última vela HTF CERRADA al cierre de la
+    vela M1 (sin lookahead): una vela HTF que abre en T cubre [T, T+tf) y
+    solo se usa desde la vela M1 cuyo cierre es >= T+tf. -1 = aún no hay.
+    """
+    m1_close = (df.index + pd.Timedelta(minutes=1)).asi8
+    pyramid = {}
+    for tf, rule in TIMEFRAMES.items():
+        htf = df[["open", "high", "low", "close"]].resample(rule).agg(
+            {"open": "first", "high": "max", "low": "min", "close": "last"}).dropna()
+        htf = bt.calculate_indicators(htf, ATR_PERIOD, EMA_PERIOD)
+
+        htf_close = (htf.index + pd.Timedelta(rule)).asi8
+        level = {f: htf[f].to_numpy(dtype=float) for f in FIELDS}
+        level["time"] = htf.index.asi8
+        level["map"] = np.searchsorted(htf_close, m1_close, side="right") - 1
+        pyramid[tf] = level
+    return pyramid
+
+def _config():
+    """Configuración con la que se construyó la pirámide (parte de la llave del cache)."""
+    return {"timeframes": np.array([f"{tf}={rule}" for tf, rule in TIMEFRAMES.items()]),
+            "fields": np.array(FIELDS), "periods": np.array([ATR_PERIOD, EMA_PERIOD])}
+
+def save_pyramid(pyramid, csv_path):
+    st = os.stat(csv_path)
+    arrays = {f"{tf}_{k}": v for tf, level in pyramid.items() for k, v in level.items()}
+    savez_atomic(cache_path(csv_path), src_size=st.st_size, src_mtime=st.st_mtime_ns, **_config(), **arrays)
+
+def load_pyramid(csv_path, df=None):
+    """
+    Pirámide cacheada junto al CSV. Se reconstruye si el CSV cambió
+    (tamaño / mtime), si cambiaron TIMEFRAMES, FIELDS o los periodos de
+    los indicadores, o si no existe el cache.
+    """
+    cached = load_npz(cache_path(csv_path))
+    st = os.stat(csv_path)
+    if cached is not None and set(_config()) <= set(cached.files):
+        if (int(cached["src_size"]) == st.st_size and int(cached["src_mtime"]) == st.st_mtime_ns
+                and all(np.array_equal(cached[k], v) for k, v in _config().items())):
+            return {tf: {k: cached[f"{tf}_{k}"] for k in FIELDS + ["time", "map"]} for tf in TIMEFRAMES}
+
+    if df is None:
+        df = bt.load_data(csv_path)
+    pyramid = build_pyramid(df)
+    save_pyramid(pyramid, csv_path)
+    return pyramid
+
+# =========================
+# 3. CONSULTAS O(1)
+# =========================
+
+def htf_at(pyramid, tf, field, i):
+    """Valor de `field` en la última vela `tf` cerrada a la vela M1 i."""
+    j = pyramid[tf]["map"][i]
+    return pyramid[tf][field][j] if j >= 0 else np.nan
+
+def attach_htf(df, pyramid, fields=ATTACH_FIELDS):
+    """Agrega columnas alineadas (ej. 'm15_ema') con un gather vectorizado."""
+    for tf, level in pyramid.items():
+        m = level["map"]
+        valid = m >= 0
+        for f in fields:
+            col = np.full(len(m), np.nan)
+            col[valid] = level[f][m[valid]]
+            df[f"{tf.lower()}_{f}"] = col
+    return df
+
+def load_data_htf(csv_path):
+    """bt.load_data + columnas HTF desde el cache (sin resamplear por corrida)."""
+    df = bt.load_data(csv_path)
+    return attach_htf(df, load_pyramid(csv_path, df))
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        pyr = load_pyramid(path)
+        sizes = " | ".join(f"{tf}: {len(level['close'])}" for tf, level in pyr.items())
+        print(f"✅ {cache_path(path)} -> {sizes}")
@@ -0,0 +1,42 @@
+import os
+import zipfile
+import tempfile
+import numpy as np
+
+# =========================
+# CACHES .npz JUNTO AL CSV
+# =========================
+# Los usan data_quality (índice de calidad) y mtf_pyramid (pirámide HTF).
+# Varios procesos pueden cargar el mismo CSV a la vez (batch con dos perfiles
+# de costo, workers con disco compartido) y la carpeta de datos puede ser de
+# solo lectura: el cache es una optimización, nunca debe tumbar la carga.
+
+def load_npz(path):
+    """Cache abierto, o None si no existe o está corrupto (se reconstruye)."""
+    if not os.path.exists(path):
+        return None
+    try:
+        return np.load(path)
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"⚠️ Cache ilegible {path} ({e}); se reconstruye.")
+        return None
+
+def savez_atomic(path, **arrays):
+    """
+    np.savez a un temporal en la misma carpeta + os.replace: quien lee ve
+    el archivo viejo o el nuevo completo. Si no se puede escribir, avisa y
+    devuelve False (el llamador sigue con lo que tiene en memoria).
+    """
+    tmp = None
+    try:
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "wb") as fh:
+            np.savez(fh, **arrays)
+        os.replace(tmp, path)
+        return True
+    except OSError as e:
+        print(f"⚠️ No se pudo guardar el cache {path} ({e}); se usa el de memoria.")
+        if tmp is not None and os.path.exists(tmp):
+            try: os.remove(tmp)
+            except OSError: pass
+        return False
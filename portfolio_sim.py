@@ -0,0 +1,207 @@
+import os
+import sys
+import heapq
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import backtest_fvg as bt
+from backtest_batch import load_manifest, max_drawdown_pct
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+# Capital COMPARTIDO entre todos los símbolos/configuraciones.
+CAPITAL_INICIAL = bt.CAPITAL_INICIAL
+RIESGO_POR_TRADE = bt.RIESGO_POR_TRADE
+
+# --- Límites de Riesgo Concurrente ---
+MAX_RIESGO_ABIERTO = 0.03   # Suma de riesgo abierto <= 3% del saldo
+MAX_POSICIONES = 3          # Posiciones abiertas simultáneas (todas las fuentes)
+MAX_POR_SIMBOLO = 1         # Posiciones abiertas simultáneas por símbolo
+
+# Configuraciones a combinar (se aplican a cada dataset del manifiesto)
+CONFIGS = [
+    {"rr": 3.0, "stop_mult": 0.75},
+]
+
+OUTPUT_PATH = "portfolio_equity.csv"
+
+# Tipos de evento. A igual timestamp, las salidas se procesan ANTES que las
+# entradas para liberar riesgo y acreditar PnL.
+EXIT, ENTRY = 0, 1
+
+# =========================
+# 2. GENERACIÓN DE TRADES (POR FUENTE)
+# =========================
+
+def generate_trades(entry, rr, stop_mult):
+    """
+    Corre una fuente (dataset + config) y devuelve sus trades ordenados por
+    hora de fill como arrays: fill_ns, exit_ns (int64, epoch ns) y r.
+    None si el CSV no existe.
+    """
+    try:
+        df = bt.load_data(entry["csv_path"])
+    except FileNotFoundError:
+        return None
+    fills, exits, rs = [], [], []
+    for d in bt.split_days(df):
+        t = bt.process_day(d, rr_target=rr, stop_mult=stop_mult,
+                           spread=entry["spread"], comision_r=entry["comision_r"],
+                           slippage_points=entry["slippage_points"], detail=True)
+        if t is None: continue
+        fills.append(t['fill_time'].value)
+        exits.append(t['exit_time'].value)
+        rs.append(t['r'])
+
+    order = np.argsort(fills, kind="stable")
+    return {
+        "label": f"{entry['symbol']} {os.path.basename(entry['csv_path'])} RR{rr}/SL{stop_mult}",
+        "symbol": entry["symbol"],
+        "fill_ns": np.asarray(fills, dtype=np.int64)[order],
+        "exit_ns": np.asarray(exits, dtype=np.int64)[order],
+        "r": np.asarray(rs, dtype=float)[order],
+    }
+
+def generate_all(manifest, configs=CONFIGS, max_workers=None):
+    jobs = [(e, c["rr"], c["stop_mult"]) for e in manifest for c in configs]
+    workers = max_workers or min(len(jobs), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(generate_trades, *job) for job in jobs]
+        # Se conserva el orden de los jobs para que el merge sea determinista
+        streams = []
+        for (entry, _, _), f in zip(jobs, futures):
+            st = f.result()
+            if st is None:
+                print(f"   ⚠️ {entry['symbol']} {entry['csv_path']}: CSV no encontrado, se omite.")
+                continue
+            streams.append(st)
+        return streams
+
+# =========================
+# 3. SIMULADOR DE PORTAFOLIO (COLA DE EVENTOS)
+# =========================
+
+def simulate_portfolio(streams, capital=CAPITAL_INICIAL, riesgo=RIESGO_POR_TRADE,
+                       max_riesgo_abierto=MAX_RIESGO_ABIERTO, max_posiciones=MAX_POSICIONES,
+                       max_por_simbolo=MAX_POR_SIMBOLO):
+    """
+    Mezcla cronológicamente las entradas/salidas de todas las fuentes con un
+    heap. Cada fuente solo tiene en el heap su PRÓXIMA entrada, más las
+    salidas de posiciones abiertas: el heap nunca crece más que
+    (#fuentes + #posiciones abiertas), sin importar cuántos eventos haya.
+
+    El riesgo de cada trade se fija con el saldo realizado al momento del
+    fill. Si abrirlo rompe algún límite, el trade se descarta.
+
+    Devuelve (curva, stats): curva es un DataFrame indexado por hora de
+    salida con el saldo después de cada cierre.
+    """
+    # Listas de Python: el acceso por elemento es mucho más barato que en numpy
+    fills = [st["fill_ns"].tolist() for st in streams]
+    exits = [st["exit_ns"].tolist() for st in streams]
+    rs = [st["r"].tolist() for st in streams]
+    symbols = [st["symbol"] for st in streams]
+
+    heap = [(f[0], ENTRY, s, 0) for s, f in enumerate(fills) if f]
+    heapq.heapify(heap)
+
+    balance = capital
+    open_risk = 0.0
+    open_count = 0
+    open_by_symbol = {}
+    open_positions = {}  # (fuente, trade) -> riesgo en dinero
+
+    curve_ts, curve_bal, curve_src = [], [], []
+    taken = skipped = wins = 0
+
+    while heap:
+        ts, kind, s, k = heapq.heappop(heap)
+
+        if kind == EXIT:
+            risk_amount = open_positions.pop((s, k))
+            balance += risk_amount * rs[s][k]
+            open_risk -= risk_amount
+            open_count -= 1
+            open_by_symbol[symbols[s]] -= 1
+            curve_ts.append(ts)
+            curve_bal.append(balance)
+            curve_src.append(s)
+            continue
+
+        # ENTRY: programar la siguiente entrada de esta fuente
+        if k + 1 < len(fills[s]):
+            heapq.heappush(heap, (fills[s][k + 1], ENTRY, s, k + 1))
+
+        # Sizing con el saldo al momento del fill + límites concurrentes
+        risk_amount = balance * riesgo
+        sym_open = open_by_symbol.get(symbols[s], 0)
+        if (open_count >= max_posiciones or sym_open >= max_por_simbolo
+                or open_risk + risk_amount > balance * max_riesgo_abierto + 1e-9):
+            skipped += 1
+            continue
+
+        open_positions[(s, k)] = risk_amount
+        open_risk += risk_amount
+        open_count += 1
+        open_by_symbol[symbols[s]] = sym_open + 1
+        taken += 1
+        if rs[s][k] > 0: wins += 1
+        heapq.heappush(heap, (exits[s][k], EXIT, s, k))
+
+    curve = pd.DataFrame({
+        "balance": np.asarray(curve_bal, dtype=float),
+        "fuente": [streams[s]["label"] for s in curve_src],
+    }, index=pd.to_datetime(np.asarray(curve_ts, dtype=np.int64)))
+    curve.index.name = "timestamp"
+
+    stats = {
+        "capital_final": balance,
+        "trades_tomados": taken,
+        "trades_descartados": skipped,
+        "win_rate": (wins / taken * 100) if taken else 0.0,
+    }
+    return curve, stats
+
+# =========================
+# 4. EJECUCIÓN
+# =========================
+
+def main():
+    print("=== PORTAFOLIO CON CAPITAL COMPARTIDO ===")
+    manifest = load_manifest(sys.argv[1] if len(sys.argv) > 1 else None)
+
+    print(f"1. Generando trades: {len(manifest)} datasets x {len(CONFIGS)} configs...")
+    streams = generate_all(manifest)
+    if not streams:
+        print("Error: ningún dataset del manifiesto se pudo cargar.")
+        return
+    for st in streams:
+        print(f"   -> {st['label']:<55} {len(st['r']):>5} trades | {st['r'].sum():.2f} R")
+
+    print("\n2. Simulando portafolio (merge cronológico)...")
+    curve, stats = simulate_portfolio(streams)
+
+    max_dd = max_drawdown_pct(np.r_[CAPITAL_INICIAL, curve["balance"].to_numpy()])
+
+    print("-" * 40)
+    print(f"💰 CAPITAL INICIAL:  ${CAPITAL_INICIAL:,.2f}")
+    print(f"💰 CAPITAL FINAL:    ${stats['capital_final']:,.2f}")
+    print(f"📉 Max Drawdown:     {max_dd:.2f}%")
+    print(f"🎲 Trades Tomados:   {stats['trades_tomados']} (descartados por límites: {stats['trades_descartados']})")
+    print(f"📊 Win Rate:         {stats['win_rate']:.2f}%")
+
+    curve.to_csv(OUTPUT_PATH)
+    print(f"\n✅ Curva guardada en {OUTPUT_PATH}")
+
+    # Reporte: portafolio + cada fuente por separado (interés compuesto propio)
+    curves = [(f"Portafolio: {CAPITAL_INICIAL:,.0f} -> {stats['capital_final']:,.0f} | MaxDD {max_dd:.2f}%",
+               np.r_[CAPITAL_INICIAL, curve["balance"].to_numpy()])]
+    curves += [(f"{st['label']} | {st['r'].sum():.2f} R", bt.compound_equity(st['r'])) for st in streams]
+    from reporting import build_report  # matplotlib solo al reportar (no al importar este módulo)
+    index = build_report("portfolio_sim", curves, capital=CAPITAL_INICIAL)
+    print(f"📄 Reporte guardado en {index}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+import os
+import html
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+import matplotlib
+matplotlib.use("Agg")  # Sin ventanas: corre igual en servidores sin pantalla
+import matplotlib.pyplot as plt
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+REPORT_DIR = "reportes"
+MAX_PUNTOS = 2000     # Puntos por curva después de LTTB
+MAX_WORKERS = None    # None = todos los núcleos
+DPI = 100
+
+# =========================
+# 2. DOWNSAMPLING (LTTB)
+# =========================
+
+def lttb(y, n_out=MAX_PUNTOS, x=None):
+    """
+    Largest-Triangle-Three-Buckets: reduce la serie a n_out puntos
+    eligiendo en cada bucket el punto que forma el triángulo más grande
+    con el elegido anterior y el promedio del bucket siguiente. Conserva
+    picos y valles (la forma de la curva). Devuelve (x, y).
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    x = np.arange(n, dtype=float) if x is None else np.asarray(x, dtype=float)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # n_out - 2 buckets entre el primer y el último punto
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    # Promedio de cada bucket de una vez; el último punto cierra la lista
+    sizes = np.diff(np.r_[edges, n])
+    avg_x = np.add.reduceat(x, edges) / sizes
+    avg_y = np.add.reduceat(y, edges) / sizes
+    avg_x, avg_y = avg_x.tolist(), avg_y.tolist()
+    edges = edges.tolist()
+
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0], idx[-1] = 0, n - 1
+    a = 0
+    xa, ya = float(x[0]), float(y[0])
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        # Área (x2) del triángulo (a, punto, promedio del bucket siguiente)
+        dx, dy = avg_x[b + 1] - xa, avg_y[b + 1] - ya
+        area = np.abs(dx * (y[lo:hi] - ya) - dy * (x[lo:hi] - xa))
+        a = lo + int(area.argmax())
+        idx[b + 1] = a
+        xa, ya = float(x[a]), float(y[a])
+    return x[idx], y[idx]
+
+def drawdown_pct(equity):
+    eq = np.asarray(equity, dtype=float)
+    peak = np.maximum.accumulate(eq)
+    return (eq - peak) / peak * 100
+
+# =========================
+# 3. GRÁFICAS (CORREN EN LOS WORKERS)
+# =========================
+
+_FIGURA_EQUITY = {}   # Una figura por proceso: se reutiliza en cada curva
+
+def _equity_figure():
+    if not _FIGURA_EQUITY:
+        fig, (ax1, ax2) = plt.subplots(2, 1, figsize=(10, 6), sharex=True, height_ratios=[3, 1])
+        fig.subplots_adjust(left=0.09, right=0.98, top=0.90, bottom=0.09, hspace=0.08)
+        line, = ax1.plot([], [], label='Curva de Equidad (Compuesta)', color='green', linewidth=1.5)
+        capital = ax1.axhline(y=0, color='r', linestyle='--', alpha=0.5, label='Capital Inicial')
+        ax1.grid(True, alpha=0.3)
+        ax2.set_ylabel("Drawdown (%)")
+        ax2.grid(True, alpha=0.3)
+        _FIGURA_EQUITY.update(fig=fig, ax1=ax1, ax2=ax2, line=line, capital=capital, fill=None)
+    return _FIGURA_EQUITY
+
+def render_equity(path, equity, title, capital=None, xlabel="# Operaciones", ylabel="Saldo (MXN)"):
+    """Curva de equidad + panel de drawdown, ambas con LTTB."""
+    equity = np.asarray(equity, dtype=float)
+    x_eq, y_eq = lttb(equity)
+    x_dd, y_dd = lttb(drawdown_pct(equity))
+
+    f = _equity_figure()
+    ax1, ax2 = f["ax1"], f["ax2"]
+    f["line"].set_data(x_eq, y_eq)
+    f["capital"].set_visible(capital is not None)
+    if capital is not None: f["capital"].set_ydata([capital, capital])
+    ax1.legend(handles=[f["line"], f["capital"]] if capital is not None else [f["line"]], loc="upper left")
+    ax1.set_title(title)
+    ax1.set_ylabel(ylabel)
+    ax1.relim()
+    ax1.autoscale_view()
+
+    if f["fill"] is not None: f["fill"].remove()
+    f["fill"] = ax2.fill_between(x_dd, y_dd, 0, color='red', alpha=0.4, linewidth=0)
+    ax2.set_xlabel(xlabel)
+    ax2.set_xlim(0, max(len(equity) - 1, 1))
+    ax2.set_ylim(min(y_dd.min(), -0.01) * 1.05, 0)
+
+    f["fig"].savefig(path, dpi=DPI, pil_kwargs={"compress_level": 1})
+    return path
+
+def render_heatmap(path, pivot, title, fmt="{:.1f}"):
+    """Heatmap de un pivot (filas x columnas de parámetros)."""
+    values = pivot.to_numpy(dtype=float)
+    fig, ax = plt.subplots(figsize=(1.2 * values.shape[1] + 3, 0.6 * values.shape[0] + 2))
+    lim = np.nanmax(np.abs(values)) if np.isfinite(values).any() else 1.0
+    im = ax.imshow(values, cmap="RdYlGn", vmin=-lim, vmax=lim, aspect="auto")
+    fig.colorbar(im, ax=ax)
+
+    ax.set_xticks(range(values.shape[1]), [str(c) for c in pivot.columns])
+    ax.set_yticks(range(values.shape[0]), [str(i) for i in pivot.index])
+    ax.set_xlabel(pivot.columns.name or "")
+    ax.set_ylabel(pivot.index.name or "")
+    ax.set_title(title)
+    if values.size <= 400:
+        for (i, j), v in np.ndenumerate(values):
+            if np.isfinite(v): ax.text(j, i, fmt.format(v), ha="center", va="center", fontsize=8)
+
+    fig.tight_layout()
+    fig.savefig(path, dpi=DPI, pil_kwargs={"compress_level": 1})
+    plt.close(fig)
+    return path
+
+_RENDERERS = {"equity": render_equity, "heatmap": render_heatmap}
+
+def _render(job):
+    kind, kwargs = job
+    return _RENDERERS[kind](**kwargs)
+
+# =========================
+# 4. REPORTE (POOL + ÍNDICE HTML)
+# =========================
+
+def _slug(name):
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+def build_report(name, curves=(), heatmaps=(), table=None, out_dir=REPORT_DIR, capital=None,
+                 max_workers=MAX_WORKERS):
+    """
+    Renderiza todas las gráficas en un pool de procesos y arma un
+    index.html con la tabla resumen y las imágenes.
+
+    curves:   lista de (título, curva de equidad)
+    heatmaps: lista de (título, pivot DataFrame)
+    """
+    folder = os.path.join(out_dir, _slug(name))
+    os.makedirs(folder, exist_ok=True)
+
+    jobs = []
+    for k, (title, equity) in enumerate(curves):
+        path = os.path.join(folder, f"equity_{k:03d}.png")
+        jobs.append(("equity", dict(path=path, equity=np.asarray(equity, dtype=float), title=title, capital=capital)))
+    for k, (title, pivot) in enumerate(heatmaps):
+        path = os.path.join(folder, f"heatmap_{k:03d}.png")
+        jobs.append(("heatmap", dict(path=path, pivot=pivot, title=title)))
+
+    if len(jobs) <= 1:
+        paths = [_render(j) for j in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            paths = list(pool.map(_render, jobs))
+
+    titles = [t for t, _ in curves] + [t for t, _ in heatmaps]
+    parts = [f"<html><head><meta charset='utf-8'><title>{html.escape(name)}</title></head><body>",
+             f"<h1>{html.escape(name)}</h1>"]
+    if table is not None:
+        parts.append(table.to_html(index=False, float_format=lambda v: f"{v:.2f}"))
+    for title, path in zip(titles, paths):
+        parts.append(f"<h3>{html.escape(title)}</h3><img src='{os.path.basename(path)}'>")
+    parts.append("</body></html>")
+
+    index_path = os.path.join(folder, "index.html")
+    with open(index_path, "w", encoding="utf-8") as fh:
+        fh.write("\n".join(parts))
+    return index_path
@@ -0,0 +1,175 @@
+import math
+from collections import namedtuple
+from datetime import time
+
+import numpy as np
+
+# =========================
+# 1. CONFIGURACIÓN POR DEFECTO
+# =========================
+# Horario en la zona de las velas (NY en los backtests, hora del servidor
+# en el bot en vivo: el bot pasa sus propios valores).
+SESSION_START = time(9, 30)
+SESSION_END   = time(11, 0)
+RANGE_MINUTES = 5
+
+ATR_PERIOD = 14
+EMA_PERIOD = 50
+MIN_GAP_ATR = 0.1     # Tamaño mínimo del FVG (en ATR)
+MAX_RANGE_ATR = 5.0   # Días con rango de apertura > 5 ATR se descartan
+
+# 1970-01-01 en ordinal de Python (para días de datetime64)
+_EPOCH_ORDINAL = 719163
+
+Setup = namedtuple("Setup", ["time", "direction", "entry", "stop", "target", "risk"])
+
+# =========================
+# 2. MOTOR INCREMENTAL
+# =========================
+
+class SignalEngine:
+    """
+    Motor de señales FVG + Breakout vela a vela. Recibe velas CERRADAS de
+    una en una y mantiene estado O(1): EMA/ATR, rango de apertura del día y
+    las últimas tres velas. `update` devuelve un Setup o None.
+
+    Es la ÚNICA definición de las reglas de entrada: los backtests y el bot
+    en vivo lo usan tal cual.
+
+    Si se pasan `ema`/`atr` en update se usan esos valores (backtests con
+    indicadores precalculados sobre todo el histórico); si no, el motor los
+    calcula igual que calculate_indicators (EMA adjust=False, ATR Wilder
+    con ewm adjust=True y min_periods).
+    """
+
+    def __init__(self, rr_target, stop_mult, session_start=SESSION_START, session_end=SESSION_END,
+                 range_minutes=RANGE_MINUTES, atr_period=ATR_PERIOD, ema_period=EMA_PERIOD,
+                 min_gap_atr=MIN_GAP_ATR, max_range_atr=MAX_RANGE_ATR):
+        self.rr_target = rr_target
+        self.stop_mult = stop_mult
+        self.min_gap_atr = min_gap_atr
+        self.max_range_atr = max_range_atr
+
+        # Horarios como minuto del día
+        self.start_min = session_start.hour * 60 + session_start.minute
+        self.range_end_min = self.start_min + range_minutes - 1
+        self.end_min = session_end.hour * 60 + session_end.minute
+
+        # Indicadores
+        self.atr_period = atr_period
+        self._ema_alpha = 2.0 / (ema_period + 1)
+        self._atr_decay = 1.0 - 1.0 / atr_period
+        self._atr_num = 0.0
+        self._atr_den = 0.0
+        self._n = 0
+        self.ema = None
+        self.atr = math.nan
+        self._prev_close = None
+
+        # Estado del día
+        self.day = None
+        self._reset_day(None, math.nan)
+
+    def _reset_day(self, day, first_atr):
+        self.day = day
+        self.bars_today = 0
+        self.first_atr = first_atr
+        self.range_high = None
+        self.range_low = None
+        self._range_atr = math.nan
+        self.range_ok = None   # None = rango aún sin cerrar
+        self._c0 = None        # vela i-2 (high, low)
+        self._c1 = None        # vela i-1 (high, low)
+
+    def _update_indicators(self, high, low, close):
+        if self._prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self._prev_close), abs(low - self._prev_close))
+        self._prev_close = close
+        self._atr_num = tr + self._atr_decay * self._atr_num
+        self._atr_den = 1.0 + self._atr_decay * self._atr_den
+        self._n += 1
+        self.atr = self._atr_num / self._atr_den if self._n >= self.atr_period else math.nan
+        self.ema = close if self.ema is None else self.ema + self._ema_alpha * (close - self.ema)
+
+    def update(self, ts, high, low, close, ema=None, atr=None):
+        """Procesa una vela cerrada con timestamp `ts` (datetime/Timestamp)."""
+        return self.step(ts.toordinal(), ts.hour * 60 + ts.minute, ts, high, low, close, ema, atr)
+
+    def step(self, day, minute, ts, high, low, close, ema=None, atr=None):
+        if ema is None:
+            self._update_indicators(high, low, close)
+            ema, atr = self.ema, self.atr
+
+        if day != self.day:
+            self._reset_day(day, atr)
+        idx = self.bars_today
+        self.bars_today += 1
+
+        c0, self._c0, self._c1 = self._c0, self._c1, (high, low)
+        setup = None
+
+        if self.start_min <= minute <= self.range_end_min:
+            # Rango de apertura (primeros 5 min)
+            self.range_high = high if self.range_high is None else max(self.range_high, high)
+            self.range_low = low if self.range_low is None else min(self.range_low, low)
+            self._range_atr = atr
+
+        elif minute > self.range_end_min:
+            if self.range_ok is None:
+                first_ok = not (self.first_atr == 0 or math.isnan(self.first_atr))
+                self.range_ok = (first_ok and self.range_high is not None
+                                 and not (self.range_high - self.range_low) > self._range_atr * self.max_range_atr)
+
+            if self.range_ok and idx >= 2 and minute <= self.end_min:
+                setup = self._check_setup(ts, c0, high, low, close, ema, atr)
+        return setup
+
+    def _check_setup(self, ts, c0, high, low, close, ema, atr):
+        c0_high, c0_low = c0
+        min_gap = atr * self.min_gap_atr
+
+        # --- Lógica de Setup (FVG + Breakout) ---
+        if close > ema: # Tendencia Alcista
+            if (low > c0_high) and (low - c0_high >= min_gap) and (close > self.range_high):
+                entry = c0_high
+                stop = c0_low - (atr * self.stop_mult)
+                target = entry + ((entry - stop) * self.rr_target)
+                return Setup(ts, "long", entry, stop, target, abs(entry - stop))
+
+        elif close < ema: # Tendencia Bajista
+            if (high < c0_low) and (c0_low - high >= min_gap) and (close < self.range_low):
+                entry = c0_low
+                stop = c0_high + (atr * self.stop_mult)
+                target = entry - ((stop - entry) * self.rr_target)
+                return Setup(ts, "short", entry, stop, target, abs(entry - stop))
+        return None
+
+    def run(self, index, high, low, close, ema=None, atr=None):
+        """
+        Generador rápido sobre arrays históricos: produce (i, Setup) con el
+        índice de la vela que dispara el setup.
+        """
+        index_ns = np.asarray(index, dtype="datetime64[ns]")
+        days = (index_ns.astype("datetime64[D]").astype(np.int64) + _EPOCH_ORDINAL).tolist()
+        minutes = ((index_ns - index_ns.astype("datetime64[D]")).astype("timedelta64[m]").astype(np.int64)).tolist()
+        high, low, close = np.asarray(high).tolist(), np.asarray(low).tolist(), np.asarray(close).tolist()
+        ema = np.asarray(ema).tolist() if ema is not None else None
+        atr = np.asarray(atr).tolist() if atr is not None else None
+
+        step = self.step
+        for i in range(len(days)):
+            s = step(days[i], minutes[i], None, high[i], low[i], close[i],
+                     ema[i] if ema is not None else None, atr[i] if atr is not None else None)
+            if s is not None:
+                yield i, s._replace(time=index[i])
+
+def day_setups(df_day, rr_target, stop_mult, session_start=SESSION_START, session_end=SESSION_END):
+    """
+    Setups de un día usando sus columnas 'ema'/'atr' precalculadas.
+    Produce (indice_vela, Setup) en orden.
+    """
+    engine = SignalEngine(rr_target, stop_mult, session_start, session_end)
+    return engine.run(df_day.index, df_day['high'].to_numpy(), df_day['low'].to_numpy(),
+                      df_day['close'].to_numpy(), df_day['ema'].to_numpy(), df_day['atr'].to_numpy())
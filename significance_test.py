@@ -0,0 +1,252 @@
+import sys
+import itertools
+import time as pytime
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+
+import backtest_fvg as bt
+from backtest_batch import RR_PARAMS, STOP_MULT_PARAMS
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+CSV_PATH = bt.CSV_PATH
+
+N_PERMUTACIONES = 10_000
+BATCH_SIZE = 250          # Permutaciones por tarea del pool
+MAX_INTENTOS_FILL = 20    # Entradas al azar por día hasta que una se llene
+MAX_WORKERS = None        # None = todos los núcleos
+SEED = 42
+
+# =========================
+# 2. SEÑALES REALES Y PERFIL POR DÍA
+# =========================
+
+def entry_window(df_day):
+    """Índices [inicio, fin] de la ventana de entradas (después del rango de 5 min)."""
+    end_first5 = (pd.Timestamp.combine(pd.Timestamp.today(), bt.SESSION_START) + timedelta(minutes=4)).time()
+    t = df_day.index.time
+    start = np.flatnonzero(t > end_first5)
+    end = np.flatnonzero(t <= bt.SESSION_END)
+    if not len(start) or not len(end) or end[-1] < max(start[0], 2):
+        return None
+    return max(start[0], 2), end[-1]
+
+def day_block(df_day):
+    """
+    Arrays del día recortados desde la ventana de entradas hasta el cierre
+    forzoso (inclusive): es todo lo que la lógica de salida puede tocar.
+    """
+    win = entry_window(df_day)
+    if win is None: return None
+    ws, we = win
+    is_exit = df_day.index.time >= bt.SESSION_EXIT
+    x = np.flatnonzero(is_exit[ws:])
+    stop_at = ws + x[0] + 1 if len(x) else len(df_day)
+    sl = slice(ws, stop_at)
+    return {
+        'high': df_day['high'].to_numpy()[sl],
+        'low': df_day['low'].to_numpy()[sl],
+        'close': df_day['close'].to_numpy()[sl],
+        'atr': df_day['atr'].to_numpy()[sl],
+        'is_exit': is_exit[sl],
+        'n_window': we - ws + 1,
+    }
+
+def real_trades(days, rr_target, stop_mult):
+    """
+    Primer trade llenado de cada día (igual que bt.process_day), con su
+    geometría normalizada por ATR para poder reubicarlo en otra vela.
+    """
+    trades = {}
+    for d_idx, d in enumerate(days):
+        win = entry_window(d)
+        if win is None: continue
+        for i, direction, entry, stop, target, risk in bt.find_setups(d, rr_target, stop_mult):
+            if risk < (bt.SPREAD * 2): continue # Filtro Spread
+            r = bt.simulate_trade_logic(d, i+1, direction, entry, stop, target, risk)
+            if r is None: continue
+            sign = 1.0 if direction == "long" else -1.0
+            atr = d['atr'].iloc[i]
+            trades[d_idx] = {
+                'offset': i - win[0],
+                'sign': sign,
+                'entry_atr': (d['close'].iloc[i] - entry) * sign / atr,  # distancia del limit al close
+                'risk_atr': risk / atr,
+                'r': r,
+            }
+            break
+    return trades
+
+# =========================
+# 3. SIMULACIÓN VECTORIZADA (MUCHOS TRADES, UN DÍA)
+# =========================
+
+def _first(mask):
+    """Primer índice True por fila (n columnas si no hay)."""
+    k = mask.argmax(axis=1)
+    return np.where(mask[np.arange(len(mask)), k], k, mask.shape[1])
+
+def simulate_batch(block, start, sign, entry, stop, target, risk,
+                   spread=bt.SPREAD, comision_r=bt.COMISION_R, slippage_points=bt.SLIPPAGE_POINTS):
+    """
+    Máquina de estados de bt.simulate_trade_logic evaluada para M órdenes a
+    la vez sobre el mismo día (matrices M x velas). Los shorts se espejan a
+    longs. Devuelve R por orden (NaN si la orden no se llenó).
+    """
+    n = len(block['high'])
+    short = (sign < 0)[:, None]
+    hi = np.where(short, -block['low'][None, :], block['high'][None, :])
+    lo = np.where(short, -block['high'][None, :], block['low'][None, :])
+    cl = np.where(short, -block['close'][None, :], block['close'][None, :])
+    entry, stop, target = (entry * sign)[:, None], (stop * sign)[:, None], (target * sign)[:, None]
+    risk = risk[:, None]
+    rows = np.arange(len(start))
+    k = np.arange(n)[None, :]
+    is_exit = block['is_exit'][None, :]
+
+    # --- FASE 1: ORDEN PENDIENTE ---
+    live = k >= start[:, None]
+    k_fill = _first(live & (lo <= entry))
+    k_cancel = _first(live & (is_exit | (lo <= stop) | (hi >= target)))
+    filled = (k_fill < n) & (k_fill < k_cancel)
+
+    # --- FASE 2: ORDEN ABIERTA ---
+    live = k >= k_fill[:, None]
+    k_x = _first(live & is_exit)
+    k_be = _first(live & (hi >= entry + risk * 1.5))
+    k_sl = _first(live & (lo <= stop))
+    k_tp = _first(live & (hi >= target))
+
+    after_be = k >= k_be[:, None]
+    k_tp2 = _first(after_be & (hi >= target))
+    k_bes = _first(after_be & (lo <= entry + spread))
+
+    entry, stop, target, risk = entry[:, 0], stop[:, 0], target[:, 0], risk[:, 0]
+
+    first_exit = np.minimum(k_sl, k_tp)
+    forced = k_x <= np.minimum(first_exit, k_be)
+    pre_be = ~forced & (first_exit < k_be)
+    be_stop = ~forced & ~pre_be & (k_bes <= k_tp2) & (k_bes < k_x)
+    be_tp = ~forced & ~pre_be & ~be_stop & (k_tp2 < k_x)
+
+    # Cierre forzoso (o fin de datos) por defecto
+    r = (cl[rows, np.minimum(k_x, n - 1)] - entry) / risk
+    r = np.where(pre_be & (k_sl <= k_tp), (stop - slippage_points - entry) / risk, r)
+    r = np.where(pre_be & (k_sl > k_tp), (target - entry) / risk, r)
+    r = np.where(be_stop, spread / risk, r)
+    r = np.where(be_tp, (target - entry) / risk, r)
+    return np.where(filled, r - comision_r, np.nan)
+
+# =========================
+# 4. PERMUTACIONES (WORKERS)
+# =========================
+
+_CTX = {}
+
+def _init_worker(blocks, profiles, offsets):
+    _CTX['blocks'] = blocks
+    _CTX['profiles'] = profiles
+    _CTX['offsets'] = offsets
+
+def run_permutations(seed_seq, n_perm):
+    """
+    Para cada día con señal real se reubica la entrada en una vela al azar
+    (muestreada del perfil empírico de horarios de las señales reales),
+    conservando dirección y geometría (en ATR) del trade real de ese día.
+
+    Igual que process_day, el día solo cuenta la primera orden que pasa el
+    filtro de spread y se LLENA: si la entrada al azar no se llena se sortea
+    otra (hasta MAX_INTENTOS_FILL). Así el nulo tiene el mismo número de
+    trades que la serie real. La misma secuencia de horarios aleatorios se
+    usa para todas las configuraciones del grid, así que el máximo del grid
+    es comparable con el real.
+
+    Devuelve matriz (n_perm, n_configs) con el R total de cada permutación.
+    """
+    rng = np.random.default_rng(seed_seq)
+    blocks, profiles, offsets = _CTX['blocks'], _CTX['profiles'], _CTX['offsets']
+    totals = np.zeros((n_perm, len(profiles)))
+
+    for d_idx, block in blocks.items():
+        draws = rng.choice(offsets, size=(MAX_INTENTOS_FILL, n_perm))
+        draws = np.minimum(draws, block['n_window'] - 1)
+
+        for c, (rr, _sm, trades) in enumerate(profiles):
+            t = trades.get(d_idx)
+            if t is None: continue
+            pending = np.arange(n_perm)
+            for j_all in draws:
+                j = j_all[pending]
+                close, atr = block['close'][j], block['atr'][j]
+                sign = np.full(len(j), t['sign'])
+                entry = close - sign * t['entry_atr'] * atr
+                risk = t['risk_atr'] * atr
+                stop = entry - sign * risk
+                target = entry + sign * risk * rr
+                r = simulate_batch(block, j + 1, sign, entry, stop, target, risk)
+                valid = np.isfinite(atr) & (atr > 0) & (risk >= bt.SPREAD * 2)  # Filtro Spread
+                filled = valid & np.isfinite(r)
+                totals[pending[filled], c] += r[filled]
+                pending = pending[~filled]
+                if not len(pending): break
+    return totals
+
+# =========================
+# 5. EJECUCIÓN
+# =========================
+
+def main():
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    print("=== TEST DE SIGNIFICANCIA (Entradas Aleatorias) ===")
+    print(f"1. Cargando {csv_path}...")
+    try:
+        days = bt.split_days(bt.load_data(csv_path))
+    except FileNotFoundError:
+        print(f"Error: No se encuentra '{csv_path}'")
+        return
+
+    print("2. Señales reales por configuración del grid...")
+    profiles = []
+    for rr, sm in itertools.product(RR_PARAMS, STOP_MULT_PARAMS):
+        trades = real_trades(days, rr, sm)
+        profiles.append((rr, sm, trades))
+        print(f"   RR={rr:<4} Stop={sm:<5} -> {len(trades):>4} trades | {sum(t['r'] for t in trades.values()):.2f} R")
+
+    real_totals = np.array([sum(t['r'] for t in trades.values()) for _, _, trades in profiles])
+    best = int(real_totals.argmax())
+    offsets = np.array([t['offset'] for _, _, trades in profiles for t in trades.values()])
+    if not len(offsets):
+        print("⚠️ No hay señales reales que permutar.")
+        return
+
+    signal_days = {d for _, _, trades in profiles for d in trades}
+    blocks = {d: b for d in sorted(signal_days) if (b := day_block(days[d])) is not None}
+
+    n_batches = -(-N_PERMUTACIONES // BATCH_SIZE)
+    sizes = [min(BATCH_SIZE, N_PERMUTACIONES - b * BATCH_SIZE) for b in range(n_batches)]
+    seeds = np.random.SeedSequence(SEED).spawn(n_batches)
+
+    print(f"\n3. Corriendo {N_PERMUTACIONES} permutaciones en {n_batches} lotes...")
+    t0 = pytime.perf_counter()
+    with ProcessPoolExecutor(max_workers=MAX_WORKERS, initializer=_init_worker,
+                             initargs=(blocks, profiles, offsets)) as pool:
+        perm = np.vstack(list(pool.map(run_permutations, seeds, sizes)))
+    elapsed = pytime.perf_counter() - t0
+
+    # p-value con corrección +1 (la serie real cuenta como una permutación)
+    p_best = (1 + (perm[:, best] >= real_totals[best]).sum()) / (1 + len(perm))
+    p_grid = (1 + (perm.max(axis=1) >= real_totals[best]).sum()) / (1 + len(perm))
+
+    rr, sm, _ = profiles[best]
+    print("-" * 40)
+    print(f"✅ Mejor config real: RR={rr} | Stop={sm}xATR | {real_totals[best]:.2f} R")
+    print(f"🎲 Aleatorio (misma config): media {perm[:, best].mean():.2f} R | p95 {np.percentile(perm[:, best], 95):.2f} R")
+    print(f"📊 p-value (config fija):          {p_best:.4f}")
+    print(f"📊 p-value (máximo del grid):      {p_grid:.4f}")
+    print(f"⏱️ {len(perm)} permutaciones en {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
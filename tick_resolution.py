@@ -0,0 +1,232 @@
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+import backtest_fvg as bt
+
+# =========================
+# 1. CONFIGURACIÓN
+# =========================
+CSV_PATH = bt.CSV_PATH
+TICK_CSV_PATH = "data_xauusd_ticks_2025.csv"  # Ticks crudos de HistData (UTC)
+TICK_STORE_PATH = "data_xauusd_ticks_2025"    # Prefijo de .bin / .idx.npz
+
+RR_TARGET = 3.0
+STOP_MULT = 0.75
+
+CHUNK_SIZE = 5_000_000  # Filas por bloque al convertir el CSV de ticks
+
+TICK_DTYPE = np.dtype([("ts", "<i8"), ("bid", "<f8"), ("ask", "<f8")])
+NS_PER_MIN = 60 * 1_000_000_000
+
+# =========================
+# 2. TICK STORE (MEMORY-MAPPED + ÍNDICE POR MINUTO)
+# =========================
+
+def build_tick_store(tick_csv, out_prefix, chunk_size=CHUNK_SIZE):
+    """
+    Convierte ticks de HistData ("20250101 180000123,bid,ask,vol", UTC) a un
+    binario plano en hora de New York, más un índice minuto -> offset.
+    Se procesa por bloques para no cargar el año completo en memoria.
+    """
+    bin_path = out_prefix + ".bin"
+    with open(bin_path, "wb") as fh:
+        for chunk in pd.read_csv(tick_csv, header=None, names=["dt", "bid", "ask", "vol"], chunksize=chunk_size):
+            ts = pd.to_datetime(chunk["dt"], format="%Y%m%d %H%M%S%f")
+            ts = ts.dt.tz_localize("UTC").dt.tz_convert("America/New_York").dt.tz_localize(None)
+
+            rec = np.empty(len(chunk), dtype=TICK_DTYPE)
+            rec["ts"] = ts.to_numpy(dtype="datetime64[ns]").view("i8")
+            rec["bid"] = chunk["bid"].to_numpy(dtype=float)
+            rec["ask"] = chunk["ask"].to_numpy(dtype=float)
+            rec.tofile(fh)
+
+    ticks = np.memmap(bin_path, dtype=TICK_DTYPE, mode="r")
+    minute = ticks["ts"] // NS_PER_MIN
+
+    # Corridas contiguas del mismo minuto. En el cambio de horario de
+    # noviembre la hora 1:00-2:00 se repite (fuera de sesión): se conserva la
+    # primera corrida de cada minuto.
+    starts = np.flatnonzero(np.r_[True, minute[1:] != minute[:-1]])
+    ends = np.r_[starts[1:], len(minute)]
+    keys = minute[starts]
+    keys, first = np.unique(keys, return_index=True)
+    np.savez(out_prefix + ".idx.npz", minutes=keys, starts=starts[first], ends=ends[first])
+    return TickStore(out_prefix)
+
+class TickStore:
+    """
+    Ticks en disco (np.memmap) con índice por minuto. Solo se leen de disco
+    las páginas de los minutos que se consultan.
+    """
+
+    def __init__(self, prefix):
+        self.ticks = np.memmap(prefix + ".bin", dtype=TICK_DTYPE, mode="r")
+        idx = np.load(prefix + ".idx.npz")
+        self.minutes = idx["minutes"]
+        self.starts = idx["starts"]
+        self.ends = idx["ends"]
+        self.loaded_minutes = 0
+
+    def minute(self, ts):
+        """Precios bid del minuto que abre en `ts` (array vacío si no hay)."""
+        key = pd.Timestamp(ts).value // NS_PER_MIN
+        pos = np.searchsorted(self.minutes, key)
+        if pos == len(self.minutes) or self.minutes[pos] != key:
+            return np.empty(0)
+        self.loaded_minutes += 1
+        return np.asarray(self.ticks["bid"][self.starts[pos]:self.ends[pos]])
+
+# =========================
+# 3. SIMULACIÓN CON RESOLUCIÓN POR TICKS
+# =========================
+
+def simulate_trade_ticks(df_day, entry_idx, direction, entry_price, stop_price, target_price, risk_distance,
+                         store, stats, spread=bt.SPREAD, comision_r=bt.COMISION_R, slippage_points=bt.SLIPPAGE_POINTS):
+    """
+    Igual que bt.simulate_trade_logic, pero cuando el orden de los niveles
+    que toca una vela M1 cambia el resultado (entry/stop/trigger pendiente,
+    stop vs trigger/BE abierto, BE vs target) se reproduce el orden real con
+    los ticks de ese minuto. Las demás velas se resuelven igual que en M1.
+    """
+    # Los shorts se resuelven como longs espejando los precios
+    sign = 1.0 if direction == "long" else -1.0
+    if direction == "long":
+        hi, lo = df_day['high'].to_numpy(), df_day['low'].to_numpy()
+    else:
+        hi, lo = -df_day['low'].to_numpy(), -df_day['high'].to_numpy()
+    cl = df_day['close'].to_numpy() * sign
+    entry, stop, target = entry_price * sign, stop_price * sign, target_price * sign
+    is_exit = df_day.index.time >= bt.SESSION_EXIT
+
+    is_open = False
+    is_breakeven = False
+    current_stop = stop
+    trigger = entry + risk_distance * 1.5
+
+    def touches(h, l):
+        """Niveles en conflicto tocados por un rango [l, h] en el estado actual."""
+        if not is_open:
+            # Fill + trigger en la misma vela (target implica trigger)
+            return int(l <= entry) + int(l <= stop) + int(h >= trigger)
+        if not is_breakeven:
+            # Solo conflictos stop vs trigger/target; si llega al trigger, el
+            # stop pasa a entry + spread en esa misma vela
+            be_hit = h >= trigger
+            return int(be_hit) + int(l <= (entry + spread if be_hit else current_stop))
+        return int(l <= current_stop) + int(h >= target)
+
+    def stop_exit():
+        # Slippage solo en el stop inicial, igual que la versión M1
+        exit_p = current_stop if is_breakeven else current_stop - slippage_points
+        return ((exit_p - entry) / risk_distance) - comision_r
+
+    for k in range(entry_idx, len(df_day)):
+        # Cierre forzoso / expiración por hora
+        if is_exit[k]:
+            if not is_open: return None
+            return ((cl[k] - entry) / risk_distance) - comision_r
+
+        # ¿La vela es ambigua para el estado actual?
+        touched = touches(hi[k], lo[k])
+
+        prices = store.minute(df_day.index[k]) * sign if touched >= 2 else None
+        # Ticks que no tocan ningún nivel (otro feed): se resuelve con M1
+        if prices is not None and len(prices) and touches(prices.max(), prices.min()) > 0:
+            stats['ticks'] += 1
+            for p in prices:
+                if not is_open:
+                    if p <= stop or p >= target: return None
+                    if p > entry: continue
+                    is_open = True # FILL (Entrada)
+                if not is_breakeven and p >= trigger:
+                    current_stop = entry + spread
+                    is_breakeven = True
+                if p <= current_stop: return stop_exit()
+                if p >= target: return ((target - entry) / risk_distance) - comision_r
+            continue
+        if touched >= 2:
+            stats['sin_ticks'] += 1
+
+        # --- Resolución M1 (mismo orden que bt.simulate_trade_logic) ---
+        if not is_open:
+            if lo[k] <= stop: return None
+            if hi[k] >= target: return None
+            if lo[k] <= entry: is_open = True # FILL (Entrada)
+            if not is_open: continue
+
+        if not is_breakeven and hi[k] >= trigger:
+            current_stop = entry + spread
+            is_breakeven = True
+        if lo[k] <= current_stop: return stop_exit()
+        if hi[k] >= target: return ((target - entry) / risk_distance) - comision_r
+
+    # Cierre al final de los datos del día
+    if is_open:
+        return ((cl[-1] - entry) / risk_distance) - comision_r
+    return None
+
+def process_day_ticks(df_day, rr_target, stop_mult, store, stats,
+                      spread=bt.SPREAD, comision_r=bt.COMISION_R, slippage_points=bt.SLIPPAGE_POINTS):
+    for i, direction, entry, stop, target, risk in bt.find_setups(df_day, rr_target, stop_mult):
+        if risk < (spread * 2): continue # Filtro Spread
+        res_r = simulate_trade_ticks(df_day, i+1, direction, entry, stop, target, risk,
+                                     store, stats, spread, comision_r, slippage_points)
+        if res_r is not None:
+            return res_r # Tomamos solo el primer trade válido del día
+    return None
+
+# =========================
+# 4. EJECUCIÓN: M1 vs M1 + TICKS
+# =========================
+
+def compare(days, store, rr_target=RR_TARGET, stop_mult=STOP_MULT):
+    stats = {'ticks': 0, 'sin_ticks': 0}
+    rows = []
+    for d in days:
+        r_m1 = bt.process_day(d, rr_target=rr_target, stop_mult=stop_mult)
+        r_tk = process_day_ticks(d, rr_target, stop_mult, store, stats)
+        rows.append({'fecha': d.index[0].date(), 'R_M1': r_m1, 'R_Ticks': r_tk})
+    table = pd.DataFrame(rows)
+    a, b = table['R_M1'], table['R_Ticks']
+    same = (a.isna() & b.isna()) | (a.notna() & b.notna() & np.isclose(a.fillna(0), b.fillna(0)))
+    table['cambio'] = ~same
+    return table, stats
+
+def main():
+    print("=== RESOLUCIÓN POR TICKS DE VELAS AMBIGUAS ===")
+    if not os.path.exists(TICK_STORE_PATH + ".idx.npz"):
+        print(f"1. Construyendo tick store desde {TICK_CSV_PATH}...")
+        try:
+            store = build_tick_store(TICK_CSV_PATH, TICK_STORE_PATH)
+        except FileNotFoundError:
+            print(f"Error: No se encuentra '{TICK_CSV_PATH}'")
+            return
+    else:
+        print(f"1. Usando tick store existente {TICK_STORE_PATH}.bin")
+        store = TickStore(TICK_STORE_PATH)
+
+    csv_path = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    try:
+        days = bt.split_days(bt.load_data(csv_path))
+    except FileNotFoundError:
+        print(f"Error: No se encuentra '{csv_path}'")
+        return
+
+    print(f"2. Backtest M1 vs M1+Ticks ({len(days)} días, RR={RR_TARGET}, Stop={STOP_MULT}xATR)...")
+    table, stats = compare(days, store)
+
+    print("-" * 40)
+    print(f"📊 Total R (M1):        {table['R_M1'].sum():.2f}")
+    print(f"📊 Total R (Ticks):     {table['R_Ticks'].sum():.2f}")
+    print(f"🔍 Velas ambiguas resueltas por ticks: {stats['ticks']} (sin ticks: {stats['sin_ticks']})")
+    print(f"🔁 Trades que cambiaron: {int(table['cambio'].sum())}")
+    print(f"💾 Minutos de ticks leídos: {store.loaded_minutes} de {len(store.minutes)}")
+
+    changed = table[table['cambio']]
+    if len(changed):
+        print("\n" + changed.to_string(index=False))
+
+if __name__ == "__main__":
+    main()